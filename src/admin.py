@@ -0,0 +1,214 @@
+import asyncio
+import inspect
+import os
+import time
+from collections import Counter
+import src.ts as ts
+
+# seconds kill spends unmuting members and closing the thread before giving up
+KILL_TIMEOUT = 10
+
+class AdminServer:
+    def __init__(self, stick_manager: ts.StickManager, path: str):
+        """
+        Initializes the AdminServer.
+
+        The admin server is a console on a local Unix domain socket, served from
+        the bot's event loop. Connect with e.g. `nc -U <path>` and type "help".
+        Only the user running the bot can connect to the socket.
+
+        Parameters:
+            stick_manager (ts.StickManager): The manager holding the sessions.
+            path (str): The path of the socket file.
+        """
+        self.stick_manager = stick_manager
+        self.path = path
+        self.server = None
+        self.commands = {
+            "help": (self.cmd_help, "help - list the commands"),
+            "list": (self.cmd_list, "list - list every stick"),
+            "show": (self.cmd_show, "show <channel id> - show one stick in detail"),
+            "kill": (self.cmd_kill, "kill <channel id> - force-end a stick without going through Discord"),
+            "tasks": (self.cmd_tasks, "tasks - count outstanding asyncio tasks"),
+            "memory": (self.cmd_memory, "memory - show the memory retained by the sticks"),
+        }
+
+    def add_command(self, name: str, handler, usage: str):
+        """
+        Adds a command to the console.
+
+        Parameters:
+            name (str): The command name.
+            handler (callable): A coroutine function taking the command's
+            arguments as strings and returning its output.
+            usage (str): The usage line shown by help.
+
+        Returns:
+            None
+        """
+        self.commands[name] = (handler, usage)
+
+    async def start(self):
+        """
+        Starts listening on the socket, replacing a stale socket file if needed.
+
+        Returns:
+            None
+        """
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = await asyncio.start_unix_server(self.handle_client, path=self.path)
+        os.chmod(self.path, 0o600)
+
+    async def close(self):
+        """
+        Stops listening and removes the socket file.
+
+        Returns:
+            None
+        """
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Serves one console connection until it sends "quit" or disconnects.
+
+        Parameters:
+            reader (asyncio.StreamReader): The connection's reader.
+            writer (asyncio.StreamWriter): The connection's writer.
+
+        Returns:
+            None
+        """
+        try:
+            while True:
+                writer.write(b"> ")
+                await writer.drain()
+                line = await reader.readline()
+                if not line:
+                    break
+                words = line.decode(errors="replace").split()
+                if not words:
+                    continue
+                if words[0] == "quit":
+                    break
+                writer.write((await self.run(words[0], words[1:]) + "\n").encode())
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def run(self, name: str, args: list) -> str:
+        """
+        Runs a console command.
+
+        Parameters:
+            name (str): The command name.
+            args (list): The command's arguments.
+
+        Returns:
+            str: The command's output.
+        """
+        if name not in self.commands:
+            return f"Unknown command {name!r}, try help"
+        handler, usage = self.commands[name]
+        try:
+            inspect.signature(handler).bind(*args)
+        except TypeError:
+            return f"Usage: {usage}"
+        try:
+            return await handler(*args)
+        except Exception as e:
+            return f"Error: {e!r}"
+
+    def get_stick(self, channel_id: str) -> ts.Stick:
+        stick = self.stick_manager.sticks.get(int(channel_id))
+        if stick is None:
+            raise LookupError(f"No stick for channel {channel_id}")
+        return stick
+
+    @staticmethod
+    def describe(stick: ts.Stick) -> dict:
+        """
+        Summarises a stick for the console.
+
+        Parameters:
+            stick (ts.Stick): The stick to summarise.
+
+        Returns:
+            dict: The stick's guild, channel, thread, holder, queue depth and the
+            seconds left on its timer.
+        """
+        holder = None
+        with stick.queue.lock:
+            if stick.active and stick.queue.queue:
+                holder = stick.queue.queue[0].user_id
+            depth = len(stick.queue.queue)
+        remaining = None
+        if stick.timer_task is not None and not stick.timer_task.done() and stick.timer_deadline is not None:
+            remaining = max(0, round(stick.timer_deadline - time.time()))
+        return {
+            "guild": stick.guild_id,
+            "channel": stick.channel_id,
+            "thread": stick.thread_id,
+            "active": stick.active,
+            "holder": holder,
+            "queue": depth,
+            "timer": remaining,
+        }
+
+    async def cmd_help(self) -> str:
+        return "\n".join(usage for _, usage in self.commands.values()) + "\nquit - close the console"
+
+    async def cmd_list(self) -> str:
+        sticks = list(self.stick_manager.sticks.values())
+        lines = [f"{len(sticks)} sticks, accepting claims: {self.stick_manager.accepting}"]
+        for stick in sticks:
+            lines.append(" ".join(f"{key}={value}" for key, value in self.describe(stick).items()))
+        return "\n".join(lines)
+
+    async def cmd_show(self, channel_id: str) -> str:
+        stick = self.get_stick(channel_id)
+        lines = [f"{key}: {value}" for key, value in self.describe(stick).items()]
+        lines.append(f"super stick: {stick.super_stick_id}")
+        lines.append(f"timer task: {stick.timer_task!r}")
+        lines.append(f"retained bytes: {stick.retained_bytes()}")
+        with stick.queue.lock:
+            entries = list(stick.queue.queue)
+        for position, entry in enumerate(entries):
+            lines.append(f"  {position}: user {entry.user_id}, queued {entry.waited():.0f}s")
+        return "\n".join(lines)
+
+    async def cmd_kill(self, channel_id: str) -> str:
+        stick = self.get_stick(channel_id)
+        # a stuck stick may be stuck in any of these, so stop them all first
+        for task in (stick.starting, stick.timer_task, stick.board_task):
+            if task is not None:
+                task.cancel()
+        try:
+            restored = await asyncio.wait_for(stick.kill_session(), KILL_TIMEOUT)
+        except asyncio.TimeoutError:
+            stick.active = False
+            stick.queue.clear()
+            stick.forget()
+            return f"Killed stick for channel {channel_id}, but gave up unmuting members after {KILL_TIMEOUT} seconds"
+        finally:
+            self.stick_manager.remove_stick(stick.channel_id)
+        return f"Killed stick for channel {channel_id}, unmuted {restored} members"
+
+    async def cmd_tasks(self) -> str:
+        tasks = asyncio.all_tasks()
+        names = Counter(getattr(task.get_coro(), "__qualname__", repr(task.get_coro())) for task in tasks)
+        return "\n".join([f"{len(tasks)} tasks"] + [f"  {count} {name}" for name, count in names.most_common()])
+
+    async def cmd_memory(self) -> str:
+        report = self.stick_manager.memory_report()
+        lines = [f"{report['sessions']} sticks retain {report['total_bytes']} bytes ({report['mean_bytes']} per session, {report['projected_bytes']} per {report['projected_sessions']} sessions)"]
+        for channel_id, size in report["per_session"].items():
+            lines.append(f"  {channel_id}: {size} bytes")
+        return "\n".join(lines)
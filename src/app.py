@@ -0,0 +1,804 @@
+import signal
+import asyncio
+import discord
+import src.ts as ts
+import src.tsjson as tsjson
+import src.statestore as statestore
+import src.reconcile as reconcile
+import src.admin as admin
+import src.watchdog as watchdog
+import src.threadpool as threadpool
+import src.cache as cache
+import src.profiler as profiler
+import src.limits as limits
+import src.startup as startup
+import src.stick_logger as logger
+from discord.ext import tasks, commands
+
+class bot(discord.Client):
+    def __init__(self, config: dict, log: logger.StickLogger, timer: startup.StartupTimer, *, intents: discord.Intents, **options):
+        """
+        The constructor for the bot class.
+
+        This class is a subclass of discord.Client and is used to create a bot that
+        can connect to the Discord API and interact with the Discord client.
+
+        The constructor takes the settings, the logger, the startup timer and
+        intents, which is an instance of discord.Intents. The intents parameter is
+        used to specify which events the bot should receive from the Discord API.
+        Any other keyword arguments, such as the member cache settings, are passed
+        on to discord.Client. The components the bot runs, such as the stick
+        manager, are attached by create_app.
+
+        The constructor also creates a CommandTree instance, which is a special
+        type of discord.TreeClient that is used to store and work with application
+        commands.
+        """
+        super().__init__(intents=intents, **options)
+        self.tree = discord.app_commands.CommandTree(self)
+        self.synced = False
+        self.drained = False
+        self.config = config
+        self.log = log
+        self.timer = timer
+        self.stick_manager = None
+        self.guild_limits = None
+        self.mute_reconciler = None
+        self.admin_server = None
+        self.loop_watchdog = None
+        self.profile = None
+        # tasks started by signal handlers, kept so they aren't garbage collected
+        self.signal_tasks = set()
+        
+    @tasks.loop(minutes=5)
+    async def clear_sticks(self):
+        """
+        A task that is run every 60 seconds to clear the talking sticks.
+
+        This task is used to clean up any sticks that are no longer being used.
+
+        Parameters:
+            self (bot): The bot instance.
+
+        Returns:
+            None
+        """
+        sticks_purged = self.stick_manager.purge_sticks()
+        if sticks_purged > 0:
+            self.log.log_info(f"Removed {sticks_purged} sticks.")
+        self.stick_manager.touch_sticks()
+        if self.stick_manager.threads is not None:
+            threads_evicted = await self.stick_manager.threads.evict_idle()
+            if threads_evicted > 0:
+                self.log.log_info(f"Deleted {threads_evicted} idle session threads.")
+        self.log.flush_suppressed()
+        if sum(self.guild_limits.rejected.values()) > 0:
+            self.log.log_info(f"Capacity {self.guild_limits.summary()}")
+        if self.loop_watchdog is not None:
+            self.log.log_info(f"Event loop lag: {self.loop_watchdog.summary()}")
+        if self.mute_reconciler.stats["drift_found"] > 0:
+            self.log.log_info(self.mute_reconciler.summary())
+        report = self.stick_manager.memory_report()
+        if report["sessions"] > 0:
+            self.log.log_info(f"{report['sessions']} sticks retain {report['total_bytes']} bytes ({report['mean_bytes']} bytes per session, ~{report['projected_bytes'] // 2**20} MiB per {report['projected_sessions']} sessions)")
+
+    @tasks.loop(seconds=60)
+    async def reconcile_mutes(self):
+        """
+        A task that repairs server mutes that have drifted from the sessions.
+
+        This task compares who should be muted in every voice channel the bot has
+        run a session in with the cached voice states, and fixes the differences
+        in small batches.
+
+        Parameters:
+            self (bot): The bot instance.
+
+        Returns:
+            None
+        """
+        result = await self.mute_reconciler.sweep()
+        if result["drift_found"] > 0:
+            self.log.log_warning(f"Found {result['drift_found']} drifted mutes in {result['channels_checked']} channels, repaired {result['drift_repaired']}, {result['repair_failed']} failed.")
+
+    async def login(self, token: str):
+        """
+        Logs in to Discord, timing it as the login phase of the start. The login
+        phase ends when setup_hook is called.
+        """
+        self.timer.begin(startup.LOGIN)
+        await super().login(token)
+
+    def run_signal_task(self, coro):
+        """
+        Runs a signal handler's coroutine as a task, keeping a reference to the
+        task until it is done.
+
+        Parameters:
+            coro (coroutine): The coroutine to run.
+
+        Returns:
+            None
+        """
+        task = asyncio.create_task(coro)
+        self.signal_tasks.add(task)
+        task.add_done_callback(self.signal_tasks.discard)
+
+    async def setup_hook(self):
+        """
+        This function is called when the bot is setting up. It syncs the commands and
+        creates the necessary tables in the database.
+        """
+        self.timer.end(startup.LOGIN)
+        if not self.synced:
+            self.log.log_info('Syncing Commands...')
+            with self.timer.phase(startup.COMMAND_SYNC):
+                await self.tree.sync()
+            self.synced = True
+        self.clear_sticks.start()
+        self.reconcile_mutes.change_interval(seconds=self.config["RECONCILE_INTERVAL"])
+        self.reconcile_mutes.start()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: self.run_signal_task(self.close()))
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, lambda: self.run_signal_task(self.profile(self.config["PROFILE_SECONDS"])))
+        if self.loop_watchdog is not None:
+            self.loop_watchdog.start()
+        if self.admin_server is not None:
+            await self.admin_server.start()
+            self.log.log_info(f"Admin console listening on {self.config['ADMIN_SOCKET']}")
+        self.log.log_info('Done!')
+        self.timer.begin(startup.CACHE_READY)
+
+    async def close(self):
+        """
+        Ends every talking stick session before closing the connection to Discord.
+
+        Members are unmuted and private threads deleted concurrently across all
+        sessions, bounded by SHUTDOWN_DEADLINE seconds. Sessions that don't
+        finish in time are abandoned and logged.
+        """
+        if not self.drained:
+            self.drained = True
+            self.log.log_info(f"Shutting down, ending {len(self.stick_manager.sticks)} sticks...")
+            summary = await self.stick_manager.drain(self.config["SHUTDOWN_DEADLINE"])
+            self.log.log_info(f"Restored {summary['sessions_restored']} sessions and {summary['members_restored']} members, deleted {summary['threads_deleted']} idle threads.")
+            if summary["sessions_abandoned"] > 0:
+                self.log.log_warning(f"Abandoned {summary['sessions_abandoned']} sessions and {summary['members_abandoned']} muted members after {self.config['SHUTDOWN_DEADLINE']} seconds.")
+            if self.admin_server is not None:
+                await self.admin_server.close()
+            if self.loop_watchdog is not None:
+                self.loop_watchdog.stop()
+        await super().close()
+    
+    
+
+    @reconcile_mutes.before_loop
+    async def before_reconcile_mutes(self):
+        await self.wait_until_ready()
+
+    async def on_ready(self):
+        self.timer.end(startup.CACHE_READY)
+        await self.change_presence(activity=discord.CustomActivity("Use /help"))
+        self.log.log_info(f'{self.user} has connected to Discord!')
+        self.log.log_info(cache.startup_report(self, self.config["CACHE_POLICY"], self.timer.started))
+        if not self.timer.reported:
+            self.timer.reported = True
+            self.log.log_info(self.timer.summary())
+            self.timer.write()
+        shard_ids = getattr(self, "shard_ids", None) or ([self.shard_id] if self.shard_id is not None else None)
+        guilds_added, guilds_removed = tsjson.sync_guilds(self.guilds, shard_ids, self.shard_count)
+        if guilds_added > 0 or guilds_removed > 0:
+            self.log.log_info(f"Installed {guilds_added} new guilds and removed {guilds_removed} departed guilds.")
+        sticks_restored = self.stick_manager.restore_sticks(self.config["STATE_STALE_AFTER"])
+        if sticks_restored > 0:
+            self.log.log_info(f"Restored {sticks_restored} sticks from the state store.")
+
+# --- Utilities ---
+
+def check_admin(user: discord.User) -> bool:
+    """
+    Checks if the given user has an administrator role.
+
+    This function iterates over the roles of the user and checks if any of them
+    have administrator permissions.
+
+    Parameters:
+        user (discord.User): The Discord user to check.
+
+    Returns:
+        bool: True if the user has an administrator role, False otherwise.
+    """
+    for role in user.roles:
+        if role.permissions.administrator:
+            return True
+
+def check_thread_permissions(channel: discord.TextChannel, users: list[discord.User]) -> bool:
+    """
+    Checks if all users in a list have permissions to view a given text channel.
+
+    This function iterates over the users in the list and checks if they have the
+    'view_channel' permission for the given text channel. If any of the users do
+    not have this permission, the function returns False. If all users do have
+    this permission, the function returns True.
+
+    Parameters:
+        channel (discord.TextChannel): The text channel to check.
+        users (list[discord.User]): The users to check.
+
+    Returns:
+        bool: True if all users have permissions to view the channel, False otherwise.
+    """
+    for user in users:
+        if not channel.permissions_for(user).send_messages:
+            return False
+    return True
+
+
+def create_app(config: dict, timer: startup.StartupTimer = None) -> bot:
+    """
+    Builds the bot and everything it runs, without connecting to Discord.
+
+    Nothing is started until the returned client is run, so the bot can be
+    imported and built by benchmarks and other runners as well as bot.py.
+
+    Parameters:
+        config (dict): The settings, as returned by settings.load_config().
+        timer (startup.StartupTimer): Times the phases of the start, defaults
+        to a new timer.
+
+    Returns:
+        bot: The client, with its commands and event handlers registered.
+    """
+    if timer is None:
+        timer = startup.StartupTimer()
+    with timer.phase(startup.LOGGER):
+        log = logger.StickLogger(logger.parse_limits(config["LOG_LIMITS"]))
+    timer.begin(startup.SETUP)
+    client = bot(config, log, timer, **cache.client_options(config["CACHE_POLICY"]))
+    store = statestore.open_store(config["STATE_STORE"])
+    tsjson.use_store(store)
+    if store is not None and not statestore.claim_instance(config["INSTANCE_ID"]):
+        log.log_warning(f"Instance {config['INSTANCE_ID']} is already running, sessions will be owned by {statestore.process_token()}.")
+    thread_pool = threadpool.ThreadPool(client, config["THREAD_POOL_SIZE"], config["THREAD_POOL_IDLE"]) if config["THREAD_POOL_SIZE"] > 0 else None
+    guild_limits = limits.GuildLimits(config["MAX_SESSIONS_PER_GUILD"], config["MAX_QUEUE_LENGTH"], config["MAX_STARTS_PER_MINUTE"])
+    stick_manager = ts.StickManager(client, store, thread_pool, guild_limits)
+    mute_reconciler = reconcile.MuteReconciler(stick_manager, batch_size=config["RECONCILE_BATCH_SIZE"])
+    admin_server = admin.AdminServer(stick_manager, config["ADMIN_SOCKET"]) if config["ADMIN_SOCKET"] else None
+    loop_watchdog = watchdog.LoopWatchdog(log, threshold=config["LOOP_LAG_THRESHOLD"]) if config["LOOP_LAG_THRESHOLD"] > 0 else None
+    if admin_server is not None and loop_watchdog is not None:
+        async def show_lag():
+            return loop_watchdog.summary()
+        admin_server.add_command("lag", show_lag, "lag - show the event loop lag histogram")
+    if admin_server is not None:
+        async def show_limits():
+            return guild_limits.summary()
+        admin_server.add_command("limits", show_limits, "limits - show the capacity limits and how many claims they rejected")
+
+        async def show_mutes():
+            return mute_reconciler.summary()
+        admin_server.add_command("mutes", show_mutes, "mutes - show how many drifted mutes the reconciler has found and repaired")
+    loop_profiler = profiler.Profiler()
+
+    async def profile(seconds: float) -> str:
+        """
+        Profiles the bot for a number of seconds and logs where the result went.
+
+        Parameters:
+            seconds (float): How long to profile for.
+
+        Returns:
+            str: The profiler's summary.
+        """
+        log.log_info(f"Profiling for {seconds:g} seconds...")
+        try:
+            summary = await loop_profiler.capture(seconds)
+        except RuntimeError as e:
+            log.log_warning(str(e))
+            return str(e)
+        log.log_info(summary.splitlines()[0])
+        return summary
+
+    if admin_server is not None:
+        async def start_profile(seconds: str = str(config["PROFILE_SECONDS"])):
+            return await profile(float(seconds))
+        admin_server.add_command("profile", start_profile, "profile [seconds] - profile the bot and write a pstats file under logs/")
+
+
+    @client.event
+    async def on_guild_join(guild: discord.Guild):
+        """
+        This event is called when the bot joins a guild. It installs the guild with
+        the default settings.
+
+        Parameters:
+            guild (discord.Guild): The guild that was joined.
+        """
+        log.log_info("Joined %s", guild.name, event="guild.join")
+        tsjson.check_guild_installed(guild)
+
+    @client.event
+    async def on_guild_remove(guild: discord.Guild):
+        """
+        This event is called when the bot leaves or is removed from a guild. It drops
+        the guild's talking stick sessions and removes its settings.
+
+        Parameters:
+            guild (discord.Guild): The guild that was left.
+        """
+        sticks_dropped = stick_manager.forget_sticks(guild)
+        tsjson.remove_guild(guild)
+        log.log_info("Left %s, dropped %s sticks", guild.name, sticks_dropped, event="guild.remove")
+
+    @client.event
+    async def on_voice_state_update(member: discord.Member, before: discord.VoiceState, after: discord.VoiceState):
+        """
+        This event is called when a user's voice state is changed. It's used by the bot
+        to track when a user joins or leaves a voice channel.
+
+        If the user has joined a voice channel, the bot will check if there is an
+        existing talking stick session for the channel. If there is, the bot will
+        add the user to the queue.
+
+        If the user has left a voice channel, the bot will check if there is an
+        existing talking stick session for the channel. If there is, the bot will
+        remove the user from the queue.
+
+        If the user has asked to speak in a stage channel with a session, and the
+        server has turned on /setstagerequests, the bot will add the user to the
+        queue.
+
+        Parameters:
+            member (discord.Member): The member whose voice state has changed.
+            before (discord.VoiceState): The voice state for the member before the change.
+            after (discord.VoiceState): The voice state for the member after the change.
+        """
+        # User joins a voice channel with active stick
+        if before.channel != after.channel and after.channel is not None:
+            existing_stick = stick_manager.get_stick_by_channel(after.channel)
+            if existing_stick is not None:
+                try:
+                    await existing_stick.handle_user_joining(member)
+                    log.log_info("%s joined %s", member.name, after.channel.name, event="voice.join")
+                except Exception as e:
+                    log.log_error(e)
+                    member.send("An error occurred while joining the session.\nThe most likely cause is that you don't have permissions for the text channel in which the session was called from.\nPlease try again, or contact an admin.")
+        # User leaves a voice channel with active stick
+        if after.channel is None:
+            existing_stick = stick_manager.get_stick_by_channel(before.channel)
+            if existing_stick is not None:
+                try:
+                    await existing_stick.handle_user_leaving(member)
+                    log.log_info("%s removed from %s", member.name, before.channel.name, event="voice.leave")
+                except Exception as e:
+                    log.log_error(e)
+        # User asks to speak in a stage channel with active stick
+        if after.channel is not None and after.requested_to_speak_at is not None and before.requested_to_speak_at is None:
+            existing_stick = stick_manager.get_stick_by_channel(after.channel)
+            if existing_stick is not None and tsjson.get_stage_requests(member.guild):
+                try:
+                    if await existing_stick.handle_speak_request(member) is not None:
+                        log.log_info("%s asked to speak in %s", member.name, after.channel.name, event="stage.request")
+                except limits.CapacityError as e:
+                    guild_limits.record(e)
+                    log.log_warning("Rejected claim in %s: %s limit", member.guild.name, e.limit, event="stick.rejected")
+                except Exception as e:
+                    log.log_error(e)
+
+    # --- User Commands ---
+
+    @client.tree.command(name="tsclaim", description="Claim the talking stick. If a talking stick session isn't started, it will start one.")
+    async def claim_stick(interaction: discord.Interaction):
+
+        """
+        Claims the talking stick.
+
+        If a talking stick session isn't started, it will start one. If the user is not in a voice channel, it will send a message indicating that.
+
+        Parameters:
+            interaction (discord.Interaction): The interaction object containing information about the command invocation and the user who invoked the command.
+
+        Returns:
+            None
+        """
+
+        # Check if the bot is shutting down
+        if not stick_manager.accepting:
+            await interaction.response.send_message("The bot is restarting. Please try again in a moment.", ephemeral=True)
+            return
+
+        # Check if the user is in a voice channel
+        if not interaction.user.voice:
+            await interaction.response.send_message("You are not in a voice channel", ephemeral=True)
+            return
+
+        # Check if all users in call have access to the text channel that the command was invoked in
+        if not check_thread_permissions(interaction.channel, interaction.user.voice.channel.members):
+            await interaction.response.send_message("ERROR:\nNot everyone in your call has access to this text channel. Please use a text channel that everyone has access to.", ephemeral=True)
+            return
+
+        # checked before the stick is added, so claims in a disabled guild don't use up its start rate
+        if not tsjson.is_guild_enabled(interaction.guild):
+            await interaction.response.send_message("Bot disabled!", ephemeral=True)
+            return
+
+        # get our stick manager to see if we have a stick active
+        existing_stick = stick_manager.get_stick_by_channel(interaction.user.voice.channel)
+        if existing_stick is None:
+            log.log_info("Creating stick for %s in %s", interaction.user.voice.channel.name, interaction.guild.name, event="stick.create")
+        try:
+            curr_stick = stick_manager.add_stick(interaction.user.voice.channel)
+        except limits.CapacityError as e:
+            guild_limits.record(e)
+            log.log_warning("Rejected claim in %s: %s limit", interaction.guild.name, e.limit, event="stick.rejected")
+            await interaction.response.send_message(str(e), ephemeral=True)
+            return
+
+        # claim the stick
+        try:
+            await curr_stick.claim(interaction)
+            log.log_info("Claiming stick for %s in %s", interaction.user.name, interaction.user.voice.channel.name, event="stick.claim")
+        except limits.CapacityError as e:
+            guild_limits.record(e)
+            log.log_warning("Rejected claim in %s: %s limit", interaction.guild.name, e.limit, event="stick.rejected")
+            await interaction.response.send_message(str(e), ephemeral=True)
+            return
+        except Exception as e:
+            log.log_error(e)
+            await interaction.response.send_message("Error claiming stick. Please try again later.\nIf the problem persists, contact an admin", ephemeral=True)
+            log.log_warning(f"Due to error, deleting stick for {interaction.user.name} in {interaction.user.voice.channel.name}")
+            await curr_stick.kill_session()
+            stick_manager.del_stick(interaction.user.voice.channel)
+            return
+
+    @client.tree.command(name="tspass", description="Pass the talking stick.")
+    async def pass_stick(interaction: discord.Interaction):
+
+        """
+        Passes the talking stick.
+
+        If the user doesn't have the stick, it will send a message indicating that.
+
+        Parameters:
+            interaction (discord.Interaction): The interaction object containing information about the command invocation and the user who invoked the command.
+
+        Returns:
+            None
+        """
+        # get our stick and pass
+        curr_stick = stick_manager.get_stick_by_channel(interaction.user.voice.channel)
+        # no active stick for this call
+        if curr_stick is None:
+            await interaction.response.send_message("There is no active talking stick!", ephemeral=True)
+            return
+        log.log_info("Passing stick for %s in %s", interaction.user.name, interaction.user.voice.channel.name, event="stick.pass")
+        # pass
+        try:
+            await curr_stick.pass_stick(interaction)
+        except Exception as e:
+            log.log_error(e)
+            await interaction.response.send_message("Error passing stick. Please try again later.\nIf the problem persists, contact an admin", ephemeral=True)
+            return
+
+    @client.tree.command(name="tsqueue", description="Show who has the talking stick and who is in line.")
+    async def show_queue(interaction: discord.Interaction, page: int = 1):
+        """
+        Shows the holder of the talking stick and the queue.
+
+        Large queues are split into pages. The pages are cached by the stick until the
+        queue changes, so many users checking the queue at once is cheap.
+
+        Parameters:
+            interaction (discord.Interaction): The interaction object containing information about the command invocation and the user who invoked the command.
+            page (int): The page of the queue to show, starting at 1.
+
+        Returns:
+            None
+        """
+        if not interaction.user.voice:
+            await interaction.response.send_message("You are not in a voice channel", ephemeral=True)
+            return
+        curr_stick = stick_manager.get_stick_by_channel(interaction.user.voice.channel)
+        if curr_stick is None or not curr_stick.active:
+            await interaction.response.send_message("There is no active talking stick!", ephemeral=True)
+            return
+        pages = curr_stick.queue_pages()
+        page = min(max(page, 1), len(pages))
+        await interaction.response.send_message(pages[page - 1], ephemeral=True, allowed_mentions=discord.AllowedMentions.none())
+
+    @client.tree.command(name="help", description="Get help for the bot.")
+    async def print_help(interaction: discord.Interaction):
+        """
+        Get help for the bot.
+
+        This command sends a message explaining how to use the bot and listing all the commands.
+        """
+        log.log_info("%s used /help in %s", interaction.user.name, interaction.guild.name, event="command.help")
+
+        # Admin commands
+        if check_admin(interaction.user):
+            try:
+                await interaction.response.send_message(
+                    "Talking Stick is a discord bot that allows you to have a talking stick session in a voice channel.\n"
+                    "To use the bot, claim the talking stick by typing /tsclaim. You must be in a voice channel.\n"
+                    "\nCommands:\n"
+                    "/tsclaim - Claim the talking stick\n"
+                    "/tspass - Pass the talking stick\n"
+                    "/tsqueue - Show who has the talking stick and who is in line\n"
+                    "/enable - Enable the bot\n"
+                    "/disable - Disable the bot\n"
+                    "/settimeout - Set the timeout for the bot\n"
+                    "/setadaptive - Make the timeout adapt to how many people are in line\n"
+                    "/setmode - Set whether sessions mute members or use channel permissions\n"
+                    "/setboard - Show sessions on one pinned status message\n"
+                    "/setstagerequests - Put people who ask to speak in a stage channel in line\n"
+                    "/help - Get help for the bot", 
+                    ephemeral=True
+                )
+                return
+            except Exception as e:
+                log.log_error(e)
+                await interaction.channel.send("An error occurred while sending help.\nPlease try again, or contact an admin.")
+
+        # User commands
+        try:
+            await interaction.response.send_message(
+                "Talking Stick is a discord bot that allows you to have a talking stick session in a voice channel.\n"
+                "To use the bot, claim the talking stick by typing /tsclaim. You must be in a voice channel.\n"
+                "\nCommands:\n"
+                "/tsclaim - Claim the talking stick\n"
+                "/tspass - Pass the talking stick\n"
+                "/tsqueue - Show who has the talking stick and who is in line\n"
+                "/help - Get help for the bot", 
+                ephemeral=True
+            )
+        except Exception as e:
+            log.log_error(e)
+            await interaction.channel.send("An error occurred while sending help.\nPlease try again, or contact an admin.")
+
+    # --- Admin Commands ---
+
+    # @client.tree.command(name="super", description="Grants a user a super stick.")
+    # @commands.has_permissions(administrator=True)
+    # async def super_stick(interaction: discord.Interaction, user: discord.User):
+    #     """
+    #     Grants a user a super stick.
+
+    #     This command is only available to server admins. If the user is not an admin, it will send a message indicating that.
+
+    #     Parameters:
+    #         interaction (discord.Interaction): The interaction object containing information about the command invocation and the user who invoked the command.
+    #         user (discord.User): The user to grant a super stick to.
+
+    #     Returns:
+    #         None
+    #     """
+    #     log.log_info(f"{interaction.user.name} used /super in {interaction.guild.name}")
+    #     existing_stick = stick_manager.get_stick_by_channel(interaction.user.voice.channel)
+    #     if existing_stick is None:
+    #         await interaction.response.send_message("There is no active talking stick!", ephemeral=True)
+    #         return
+
+    #     if check_admin(interaction.user):
+    #         existing_stick.assign_super_stick(user)
+    #         await interaction.response.send_message(f"Super stick granted to {user.name}", ephemeral=True)
+    #     else:
+    #         await interaction.response.send_message("You are not an admin!", ephemeral=True)
+
+    @client.tree.command(name="enable", description="Enable the bot.")
+    @commands.has_permissions(administrator=True)
+    async def enable(interaction: discord.Interaction):
+        """
+        Enables the bot in the current server.
+
+        This command is only available to server admins. If the user is not an admin, it will send a message indicating that.
+
+        Parameters:
+            interaction (discord.Interaction): The interaction object containing information about the command invocation and the user who invoked the command.
+
+        Returns:
+            None
+        """
+        log.log_info("%s used /enable in %s", interaction.user.name, interaction.guild.name, event="command.admin")
+        if check_admin(interaction.user):
+            tsjson.enable_guild(interaction.guild)
+            await interaction.response.send_message("The bot is now enabled for this server", ephemeral=True)
+        else:
+            await interaction.response.send_message("You are not an admin!", ephemeral=True)
+
+    @client.tree.command(name="disable", description="Disable the bot.")
+    @commands.has_permissions(administrator=True)
+    async def disable(interaction: discord.Interaction):
+        """
+        Disables the bot in the current server.
+
+        This command can only be executed by server administrators. It disables the bot for the server,
+        ends any active talking stick sessions, and sends a confirmation message. If the user is not an
+        administrator, it sends a message indicating lack of permissions.
+
+        Parameters:
+            interaction (discord.Interaction): The interaction object containing information about the
+            command invocation and the user who invoked the command.
+
+        Returns:
+            None
+        """
+        log.log_info("%s used /disable in %s", interaction.user.name, interaction.guild.name, event="command.admin")
+        if not check_admin(interaction.user):
+            await interaction.response.send_message("You are not an admin!", ephemeral=True)
+            return
+        await interaction.response.send_message("The bot is now disabled for this server", ephemeral=True)
+        tsjson.disable_guild(interaction.guild)
+        await stick_manager.kill_sticks(interaction.guild)
+
+
+    @client.tree.command(name="settimeout", description="Set the timeout (in seconds) for the talking stick.")
+    @commands.has_permissions(administrator=True)
+    async def set_timeout(interaction: discord.Interaction, duration: int):
+        """
+        Sets the timeout for the talking stick in the current server.
+
+        This command can only be executed by server administrators. It sets the timeout
+        for the talking stick in the server, sends a confirmation message, and ends any
+        active talking stick sessions. If the user is not an administrator, it sends a
+        message indicating lack of permissions.
+
+        Parameters:
+            interaction (discord.Interaction): The interaction object containing
+            information about the command invocation and the user who invoked the
+            command.
+            duration (int): The timeout duration in seconds.
+
+        Returns:
+            None
+        """
+        log.log_info("%s used /settimeout in %s", interaction.user.name, interaction.guild.name, event="command.admin")
+        if check_admin(interaction.user):
+            tsjson.set_stick_timeout(interaction.guild, duration)
+            await interaction.response.send_message(f"Timeout set to {duration} seconds", ephemeral=True)
+        else:
+            await interaction.response.send_message("You are not an admin!", ephemeral=True)
+
+    @client.tree.command(name="setadaptive", description="Make the talking stick timeout adapt to how many people are in line.")
+    @commands.has_permissions(administrator=True)
+    async def set_adaptive(interaction: discord.Interaction, target_wait: int, floor: int, ceiling: int):
+        """
+        Makes the talking stick timeout in the current server adapt to the queue.
+
+        Each holder gets the target wait divided by the number of people in line, so
+        the line moves faster when it is long and speakers aren't cut off when it is
+        short, but never less than floor or more than ceiling seconds. Use /settimeout
+        to go back to a fixed timeout.
+
+        This command can only be executed by server administrators.
+
+        Parameters:
+            interaction (discord.Interaction): The interaction object containing
+            information about the command invocation and the user who invoked the
+            command.
+            target_wait (int): The longest anyone in line should wait, in seconds.
+            floor (int): The least time a holder gets, in seconds.
+            ceiling (int): The most time a holder gets, in seconds.
+
+        Returns:
+            None
+        """
+        log.log_info("%s used /setadaptive in %s", interaction.user.name, interaction.guild.name, event="command.admin")
+        if not check_admin(interaction.user):
+            await interaction.response.send_message("You are not an admin!", ephemeral=True)
+            return
+        if target_wait <= 0 or floor <= 0 or floor > ceiling:
+            await interaction.response.send_message("The target wait and floor must be positive, and the floor can't be above the ceiling", ephemeral=True)
+            return
+        tsjson.set_adaptive_timeout(interaction.guild, target_wait, floor, ceiling)
+        await interaction.response.send_message(f"Timeout set to share {target_wait} seconds between the people in line, between {floor} and {ceiling} seconds each", ephemeral=True)
+
+    @client.tree.command(name="setmode", description="Set how talking stick sessions keep people quiet.")
+    @discord.app_commands.choices(mode=[
+        discord.app_commands.Choice(name="mute - server-mute everyone but the holder", value=ts.MUTE),
+        discord.app_commands.Choice(name="audience - take speak permission away from the channel", value=ts.AUDIENCE),
+    ])
+    @commands.has_permissions(administrator=True)
+    async def set_mode(interaction: discord.Interaction, mode: discord.app_commands.Choice[str]):
+        """
+        Sets the session mode for the current server.
+
+        In mute mode every member of the voice channel is server-muted except the holder.
+        In audience mode the channel's speak permission is denied to @everyone and allowed
+        to the holder instead, which costs the same few calls however large the channel is.
+        Administrators ignore channel permissions and can always speak in audience mode.
+
+        This command can only be executed by server administrators. The mode applies to
+        sessions started after it is set.
+
+        Parameters:
+            interaction (discord.Interaction): The interaction object containing
+            information about the command invocation and the user who invoked the
+            command.
+            mode (discord.app_commands.Choice[str]): The session mode.
+
+        Returns:
+            None
+        """
+        log.log_info("%s used /setmode in %s", interaction.user.name, interaction.guild.name, event="command.admin")
+        if check_admin(interaction.user):
+            tsjson.set_session_mode(interaction.guild, mode.value)
+            await interaction.response.send_message(f"Session mode set to {mode.value}", ephemeral=True)
+        else:
+            await interaction.response.send_message("You are not an admin!", ephemeral=True)
+
+    @client.tree.command(name="setboard", description="Show sessions on one pinned status message instead of a message per event.")
+    @commands.has_permissions(administrator=True)
+    async def set_board(interaction: discord.Interaction, interval: int):
+        """
+        Sets the status board interval for the current server.
+
+        With a status board, each session keeps one pinned message in its thread
+        showing the holder, their time left and the next few in line. It is edited
+        at most once every interval seconds, and only the start and end of the
+        session are sent as messages of their own. An interval of 0 goes back to a
+        message for every claim, pass, timeout, join and leave.
+
+        This command can only be executed by server administrators. The setting
+        applies to sessions started after it is set.
+
+        Parameters:
+            interaction (discord.Interaction): The interaction object containing
+            information about the command invocation and the user who invoked the
+            command.
+            interval (int): The least seconds between edits, or 0 to turn the
+            status board off.
+
+        Returns:
+            None
+        """
+        log.log_info("%s used /setboard in %s", interaction.user.name, interaction.guild.name, event="command.admin")
+        if not check_admin(interaction.user):
+            await interaction.response.send_message("You are not an admin!", ephemeral=True)
+            return
+        if interval < 0:
+            await interaction.response.send_message("The interval can't be negative", ephemeral=True)
+            return
+        tsjson.set_status_board(interaction.guild, interval)
+        if interval == 0:
+            await interaction.response.send_message("Status board turned off", ephemeral=True)
+        else:
+            await interaction.response.send_message(f"Status board turned on, updated at most every {interval} seconds", ephemeral=True)
+
+    @client.tree.command(name="setstagerequests", description="Put people who ask to speak in a stage channel in line for the stick.")
+    @commands.has_permissions(administrator=True)
+    async def set_stage_requests(interaction: discord.Interaction, enabled: bool):
+        """
+        Sets whether asking to speak queues for the stick in the current server.
+
+        Sessions in stage channels move the holder on stage and everyone else to
+        the audience. With this turned on, an audience member who asks to speak
+        during a session is put in line as if they had used /tsclaim.
+
+        This command can only be executed by server administrators.
+
+        Parameters:
+            interaction (discord.Interaction): The interaction object containing
+            information about the command invocation and the user who invoked the
+            command.
+            enabled (bool): Whether asking to speak puts people in line.
+
+        Returns:
+            None
+        """
+        log.log_info("%s used /setstagerequests in %s", interaction.user.name, interaction.guild.name, event="command.admin")
+        if not check_admin(interaction.user):
+            await interaction.response.send_message("You are not an admin!", ephemeral=True)
+            return
+        tsjson.set_stage_requests(interaction.guild, enabled)
+        if enabled:
+            await interaction.response.send_message("Asking to speak in a stage channel now puts people in line", ephemeral=True)
+        else:
+            await interaction.response.send_message("Asking to speak in a stage channel no longer puts people in line", ephemeral=True)
+
+    client.stick_manager = stick_manager
+    client.guild_limits = guild_limits
+    client.mute_reconciler = mute_reconciler
+    client.admin_server = admin_server
+    client.loop_watchdog = loop_watchdog
+    client.profile = profile
+    timer.end(startup.SETUP)
+    return client
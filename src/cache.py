@@ -0,0 +1,84 @@
+import resource
+import time
+import discord
+
+# voice:    only voice-connected members are cached, no privileged intent needed
+# ondemand: like voice, but a guild's members are fetched when a session starts there
+#           and kept, along with members who join later, so it happens once per guild
+# full:     every member of every guild is fetched at startup and cached
+POLICIES = ("voice", "ondemand", "full")
+
+def client_options(policy: str) -> dict:
+    """
+    Builds the client's intents and member cache settings for a cache policy.
+
+    This bot only ever needs members who are in a voice channel, which the
+    voice states intent already delivers, so "voice" is enough for most hosts.
+    "ondemand" and "full" need the privileged members intent enabled in the
+    Discord Developer Portal.
+
+    Parameters:
+        policy (str): One of POLICIES.
+
+    Returns:
+        dict: The intents, member_cache_flags and chunk_guilds_at_startup
+        keyword arguments for discord.Client.
+
+    Raises:
+        ValueError: If the policy is not recognised.
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown cache policy {policy!r}, expected one of {', '.join(POLICIES)}")
+    intents = discord.Intents.default()
+    intents.voice_states = True
+    intents.members = policy != "voice"
+    if policy == "full":
+        member_cache_flags = discord.MemberCacheFlags.all()
+    else:
+        member_cache_flags = discord.MemberCacheFlags.none()
+        member_cache_flags.voice = True
+        # with voice alone, members leaving voice are dropped from the cache and
+        # a fetched guild would stop counting as chunked
+        member_cache_flags.joined = policy == "ondemand"
+    return {
+        "intents": intents,
+        "member_cache_flags": member_cache_flags,
+        "chunk_guilds_at_startup": policy == "full",
+    }
+
+async def ensure_members(client: discord.Client, guild: discord.Guild) -> None:
+    """
+    Fetches and caches every member of a guild if the client may and hasn't yet.
+
+    This is what makes the "ondemand" policy fetch members when a session
+    starts; with the other policies it does nothing. Fetched members stay
+    cached, so a guild is only fetched once.
+
+    Parameters:
+        client (discord.Client): The client, whose intents decide if it may.
+        guild (discord.Guild): The guild to fetch members for.
+
+    Returns:
+        None
+    """
+    if client.intents.members and not guild.chunked:
+        await guild.chunk(cache=True)
+
+def startup_report(client: discord.Client, policy: str, started: float) -> str:
+    """
+    Describes how long startup took and what the cache holds once ready.
+
+    Parameters:
+        client (discord.Client): The ready client.
+        policy (str): The cache policy the client runs with.
+        started (float): The time.perf_counter() at which startup began.
+
+    Returns:
+        str: The policy, time to ready, guild and cached member counts, and the
+        process' peak resident memory.
+    """
+    elapsed = time.perf_counter() - started
+    members = sum(len(guild.members) for guild in client.guilds)
+    # ru_maxrss is in KiB on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return f"Cache policy {policy}: ready in {elapsed:.1f}s with {len(client.guilds)} guilds, {members} cached members, peak RSS {peak_rss:.0f} MiB"
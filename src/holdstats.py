@@ -0,0 +1,142 @@
+import asyncio
+import math
+import sys
+import time
+
+# how quickly a session's statistics follow new holds, and how slowly a guild's prior does
+SESSION_ALPHA = 0.2
+GUILD_ALPHA = 0.05
+
+_guild_priors = {}
+
+def clock() -> float:
+    """
+    Returns the event loop's clock, so holds are timed in virtual time when the
+    bot runs under the simulator.
+    """
+    try:
+        return asyncio.get_running_loop().time()
+    except RuntimeError:
+        return time.monotonic()
+
+class HoldStats:
+    """
+    Exponentially weighted mean and variance of how long holders keep the stick.
+
+    Each hold updates the statistics in O(1) and no history is kept, so recent
+    holds count the most and the memory used never grows.
+    """
+    __slots__ = ("alpha", "mean", "variance", "count")
+
+    def __init__(self, alpha: float = SESSION_ALPHA, mean: float = None, variance: float = 0.0, count: int = 0):
+        """
+        Initializes the HoldStats.
+
+        Parameters:
+            alpha (float): The weight of each new hold, between 0 and 1.
+            mean (float): The mean hold in seconds, or None before the first hold.
+            variance (float): The variance of the holds in seconds squared.
+            count (int): The number of holds recorded so far.
+        """
+        self.alpha = alpha
+        self.mean = mean
+        self.variance = variance
+        self.count = count
+
+    def record(self, seconds: float):
+        """
+        Adds a hold to the statistics.
+
+        Parameters:
+            seconds (float): How long the holder kept the stick.
+
+        Returns:
+            None
+        """
+        self.count += 1
+        if self.mean is None:
+            self.mean = seconds
+            return
+        diff = seconds - self.mean
+        increment = self.alpha * diff
+        self.mean += increment
+        self.variance = (1 - self.alpha) * (self.variance + diff * increment)
+
+    def seeded(self, alpha: float = SESSION_ALPHA) -> "HoldStats":
+        """
+        Returns a copy of the statistics that follows new holds with alpha.
+        """
+        return HoldStats(alpha, self.mean, self.variance, self.count)
+
+    def estimate_wait(self, ahead: int, elapsed: float = 0.0, cap: float = 0) -> tuple:
+        """
+        Estimates how long someone waits for the stick.
+
+        Parameters:
+            ahead (int): The number of holds before theirs, counting the
+            current holder's.
+            elapsed (float): Seconds the current holder has had the stick.
+            cap (float): The most a hold can last, e.g. the stick timeout, or 0
+            for no limit.
+
+        Returns:
+            tuple: The expected wait and its standard deviation in seconds, or
+            None before any hold has been seen.
+        """
+        if self.mean is None or ahead < 1:
+            return None
+        hold = min(self.mean, cap) if cap > 0 else self.mean
+        wait = max(hold - elapsed, 0) + (ahead - 1) * hold
+        return wait, math.sqrt(ahead * self.variance)
+
+    def retained_bytes(self) -> int:
+        """
+        Returns the number of bytes retained by the statistics.
+        """
+        return sys.getsizeof(self) + sum(sys.getsizeof(value) for value in (self.alpha, self.mean, self.variance, self.count))
+
+    def __repr__(self):
+        return f"HoldStats(mean={self.mean}, variance={self.variance}, count={self.count})"
+
+def guild_prior(guild_id: int) -> HoldStats:
+    """
+    Returns the statistics of every hold in a guild since the bot started, which
+    new sessions in the guild start from.
+
+    Parameters:
+        guild_id (int): The id of the guild.
+
+    Returns:
+        HoldStats: The guild's statistics.
+    """
+    prior = _guild_priors.get(guild_id)
+    if prior is None:
+        prior = _guild_priors[guild_id] = HoldStats(GUILD_ALPHA)
+    return prior
+
+def clear_priors():
+    """
+    Forgets every guild's prior, e.g. between simulation runs.
+
+    Returns:
+        None
+    """
+    _guild_priors.clear()
+
+def format_wait(estimate: tuple) -> str:
+    """
+    Formats an estimated wait for a message.
+
+    Parameters:
+        estimate (tuple): The expected wait and its standard deviation in seconds.
+
+    Returns:
+        str: e.g. "about 6 min (±2 min)", or "less than a minute".
+    """
+    wait, spread = estimate
+    if wait < 60:
+        return "less than a minute"
+    text = f"about {round(wait / 60)} min"
+    if spread >= 60:
+        text += f" (±{round(spread / 60)} min)"
+    return text
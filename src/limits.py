@@ -0,0 +1,86 @@
+from collections import Counter
+import src.holdstats as holdstats
+
+# the limits a claim can be rejected for
+SESSIONS = "sessions"
+QUEUE = "queue"
+START_RATE = "start_rate"
+
+class CapacityError(Exception):
+    """
+    Raised when a claim would take a guild over one of its capacity limits.
+
+    The message is meant to be shown to the user who claimed.
+    """
+
+    def __init__(self, limit: str, message: str):
+        super().__init__(message)
+        self.limit = limit
+
+class GuildLimits:
+    def __init__(self, max_sessions: int = 0, max_queue: int = 0, starts_per_minute: int = 0):
+        """
+        Initializes the GuildLimits.
+
+        The limits stop one guild from starting so many sessions, or queuing so
+        many users, that its mute sweeps starve every other guild the process
+        serves. Every limit applies per guild, and 0 turns a limit off.
+
+        Parameters:
+            max_sessions (int): The most sessions a guild may run at once.
+            max_queue (int): The most users one session may have in line.
+            starts_per_minute (int): The most sessions a guild may start per
+            minute, allowing bursts of that many.
+        """
+        self.max_sessions = max_sessions
+        self.max_queue = max_queue
+        self.starts_per_minute = starts_per_minute
+        self.buckets = {}
+        self.rejected = Counter()
+
+    def check_start(self, guild_id: int, sessions: int):
+        """
+        Checks that a guild may start another session, and takes one start from
+        its start rate if so.
+
+        Parameters:
+            guild_id (int): The id of the guild.
+            sessions (int): The number of sessions the guild is running.
+
+        Returns:
+            None
+
+        Raises:
+            CapacityError: If the guild is at its session limit or start rate.
+        """
+        if self.max_sessions > 0 and sessions >= self.max_sessions:
+            raise CapacityError(SESSIONS, f"This server already has {sessions} talking stick sessions running, the most allowed. Please try again when one ends.")
+        if self.starts_per_minute <= 0:
+            return
+        # token bucket: refills starts_per_minute tokens a minute, up to starts_per_minute
+        now = holdstats.clock()
+        tokens, updated = self.buckets.get(guild_id, (self.starts_per_minute, now))
+        tokens = min(self.starts_per_minute, tokens + (now - updated) * self.starts_per_minute / 60)
+        if tokens < 1:
+            self.buckets[guild_id] = (tokens, now)
+            raise CapacityError(START_RATE, "Too many talking stick sessions have been started in this server recently. Please try again in a minute.")
+        self.buckets[guild_id] = (tokens - 1, now)
+
+    def record(self, error: CapacityError):
+        """
+        Counts a rejected claim.
+
+        Parameters:
+            error (CapacityError): The reason the claim was rejected.
+
+        Returns:
+            None
+        """
+        self.rejected[error.limit] += 1
+
+    def summary(self) -> str:
+        """
+        Returns the limits and the claims rejected by each as one line of text.
+        """
+        rejected = ", ".join(f"{limit}={self.rejected[limit]}" for limit in (SESSIONS, QUEUE, START_RATE))
+        return f"limits sessions={self.max_sessions} queue={self.max_queue} starts/min={self.starts_per_minute}, rejected {rejected}"
@@ -0,0 +1,61 @@
+import asyncio
+import io
+from datetime import datetime
+from pathlib import Path
+
+# the bot's own code, which the capture summary is narrowed down to
+BOT_CODE = r"[/\\](app|ts|tsjson)\.py:"
+
+class Profiler:
+    def __init__(self, directory: str = "logs"):
+        """
+        Initializes the Profiler.
+
+        The profiler is off until a capture is started, so it costs nothing the
+        rest of the time. A capture runs cProfile on the event loop thread,
+        which is where every command handler, Stick and tsjson call runs, and
+        writes a pstats file that can be opened with `python -m pstats` or
+        turned into a flamegraph with tools such as snakeviz or flameprof.
+
+        Parameters:
+            directory (str): The directory the pstats files are written to.
+        """
+        self.directory = Path(directory)
+        self.running = False
+
+    async def capture(self, seconds: float, limit: int = 15) -> str:
+        """
+        Profiles the running bot for a number of seconds.
+
+        Parameters:
+            seconds (float): How long to profile for.
+            limit (int): The number of functions listed in the summary.
+
+        Returns:
+            str: Where the pstats file was written, followed by the bot's most
+            expensive functions by cumulative time.
+
+        Raises:
+            RuntimeError: If a capture is already running.
+        """
+        if self.running:
+            raise RuntimeError("A profile is already being captured")
+        # imported here so bots that never profile don't pay for pstats at startup
+        import cProfile
+        import pstats
+        self.running = True
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profile.disable()
+        finally:
+            self.running = False
+        self.directory.mkdir(exist_ok=True)
+        path = self.directory / f"profile-{datetime.now():%Y-%m-%d-%H%M%S}.pstats"
+        profile.dump_stats(path)
+        summary = io.StringIO()
+        pstats.Stats(profile, stream=summary).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(BOT_CODE, limit)
+        return f"Profiled {seconds:g} seconds into {path}\n{summary.getvalue().strip()}"
@@ -0,0 +1,109 @@
+import argparse
+import json
+import sys
+import tracemalloc
+import discord
+from discord.state import ConnectionState
+from src.stickq import QueueEntry
+
+# a typical /tsclaim interaction payload, as sent by the Discord gateway
+PAYLOAD = {
+    "id": "1253826844436856944",
+    "application_id": "1253826844436856944",
+    "type": 2,
+    "token": "a" * 180,
+    "version": 1,
+    "guild_id": "111111111111111111",
+    "channel_id": "222222222222222222",
+    "locale": "en-US",
+    "guild_locale": "en-US",
+    "app_permissions": "2251799813685247",
+    "entitlements": [],
+    "authorizing_integration_owners": {"0": "111111111111111111"},
+    "context": 0,
+    "data": {"id": "333333333333333333", "name": "tsclaim", "type": 1},
+    "member": {
+        "user": {"id": "444444444444444444", "username": "someone", "global_name": "Some One", "avatar": "a" * 32, "discriminator": "0", "public_flags": 0},
+        "roles": ["555555555555555555"],
+        "joined_at": "2024-01-01T00:00:00+00:00",
+        "deaf": False,
+        "mute": False,
+        "flags": 0,
+        "permissions": "2251799813685247",
+        "nick": None,
+        "avatar": None,
+        "premium_since": None,
+        "pending": False,
+        "communication_disabled_until": None,
+    },
+    "channel": {"id": "222222222222222222", "type": 0, "name": "general", "guild_id": "111111111111111111", "position": 0, "permission_overwrites": [], "nsfw": False, "parent_id": None, "topic": None, "last_message_id": None, "rate_limit_per_user": 0, "flags": 0},
+}
+
+def connection_state() -> ConnectionState:
+    """
+    Builds a discord.py connection state that can parse interactions without
+    connecting to Discord.
+    """
+    client = discord.Client(intents=discord.Intents.default(), member_cache_flags=discord.MemberCacheFlags.none())
+    state = client._connection
+    state.user = discord.ClientUser(state=state, data={"id": "1", "username": "talking-stick", "discriminator": "0", "avatar": None})
+    return state
+
+def measure(build, count: int) -> float:
+    """
+    Measures the memory allocated per queue entry.
+
+    Parameters:
+        build (callable): Called with an index, returns one queue entry.
+        count (int): The number of entries to build.
+
+    Returns:
+        float: The mean bytes allocated per entry.
+    """
+    before = tracemalloc.take_snapshot()
+    entries = [build(index) for index in range(count)]
+    after = tracemalloc.take_snapshot()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del entries
+    return allocated / count
+
+def benchmark(count: int = 1000) -> dict:
+    """
+    Compares the memory of the old queue entries, a dict holding the member and
+    the whole interaction, with that of a QueueEntry.
+
+    Parameters:
+        count (int): The number of entries to build of each kind.
+
+    Returns:
+        dict: The bytes per entry before and after, and the size of one
+        QueueEntry object.
+    """
+    state = connection_state()
+
+    def old_entry(index: int) -> dict:
+        interaction = discord.Interaction(data=json.loads(json.dumps(PAYLOAD)), state=state)
+        return {"user": interaction.user, "interaction": interaction}
+
+    def new_entry(index: int) -> QueueEntry:
+        return QueueEntry(444444444444444444 + index, 111111111111111111)
+
+    tracemalloc.start()
+    try:
+        before = measure(old_entry, count)
+        after = measure(new_entry, count)
+    finally:
+        tracemalloc.stop()
+    return {"before": before, "after": after, "object": sys.getsizeof(new_entry(0))}
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the memory used per queued user.")
+    parser.add_argument("--count", type=int, default=1000, help="entries built of each kind")
+    args = parser.parse_args()
+    result = benchmark(args.count)
+    print(f"Memory per entry over {args.count} entries built from a /tsclaim payload:")
+    print(f"  before (dict + Member + Interaction): ~{result['before']:.0f} bytes")
+    print(f"  after  (QueueEntry):                  ~{result['after']:.0f} bytes ({result['object']} B object)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import asyncio
+import discord
+import src.ts as ts
+
+class MuteReconciler:
+    def __init__(self, stick_manager: ts.StickManager, batch_size: int = 5, batch_delay: float = 1.0):
+        """
+        Initializes the MuteReconciler.
+
+        The reconciler compares the mute state the StickManager expects with the
+        voice states in the gateway cache, and repairs any drift: the holder and
+        super stick unmuted, everyone else muted, and nobody muted in a channel
+        without a session. Only channels the bot has run a session in are checked.
+
+        Parameters:
+            stick_manager (ts.StickManager): The manager holding the sessions.
+            batch_size (int): The number of members repaired per batch.
+            batch_delay (float): Seconds to wait between batches, to keep clear of
+            the rate limits used by the sessions themselves.
+        """
+        self.stick_manager = stick_manager
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.stats = {
+            "sweeps": 0,
+            "channels_checked": 0,
+            "drift_found": 0,
+            "drift_repaired": 0,
+            "repair_failed": 0,
+        }
+
+    @staticmethod
+    def checkable(stick: ts.Stick) -> bool:
+        """
+        Returns whether a channel's mutes can be checked against its stick: the
+        channel has no stick, or an active MUTE session that isn't ending.
+
+        Parameters:
+            stick (ts.Stick): The channel's stick, or None.
+
+        Returns:
+            bool: False if the channel must be skipped.
+        """
+        return stick is None or (stick.active and stick.ending is None and stick.mode == ts.MUTE)
+
+    def find_drift(self, channel_id: int) -> list:
+        """
+        Finds the members of a voice channel whose mute state has drifted.
+
+        Channels that are gone, or that have no session and no drift left, are
+        no longer tracked. Channels whose session is starting or ending are
+        skipped, since their mutes are still being changed, as are sessions in
+        AUDIENCE and STAGE mode, which don't use server mutes.
+
+        Parameters:
+            channel_id (int): The id of the voice channel to check.
+
+        Returns:
+            list: (member, channel id) for every drifted member.
+        """
+        channel = self.stick_manager.client.get_channel(channel_id)
+        if channel is None:
+            self.stick_manager.touched.discard(channel_id)
+            return []
+        stick = self.stick_manager.sticks.get(channel_id)
+        if not self.checkable(stick):
+            return []
+        drift = []
+        for member in channel.members:
+            if member.voice is None:
+                continue
+            expected = stick.expected_mute(member.id) if stick is not None else False
+            if member.voice.mute != expected:
+                drift.append((member, channel_id))
+        if stick is None and not drift:
+            self.stick_manager.touched.discard(channel_id)
+        return drift
+
+    async def sweep(self) -> dict:
+        """
+        Checks every touched channel and repairs drifted mutes in batches.
+
+        Returns:
+            dict: The drift found and repaired in this sweep, and the number of
+            repairs that failed.
+        """
+        drift = []
+        channel_ids = list(self.stick_manager.touched)
+        for channel_id in channel_ids:
+            drift.extend(self.find_drift(channel_id))
+        result = {"channels_checked": len(channel_ids), "drift_found": len(drift), "drift_repaired": 0, "repair_failed": 0}
+        for start in range(0, len(drift), self.batch_size):
+            if start > 0:
+                await asyncio.sleep(self.batch_delay)
+            for member, channel_id in drift[start:start + self.batch_size]:
+                # the member may have moved, been fixed or had the stick passed
+                # to or from them since the check, so work out the mute again
+                if member.voice is None or member.voice.channel is None or member.voice.channel.id != channel_id:
+                    continue
+                stick = self.stick_manager.sticks.get(channel_id)
+                if not self.checkable(stick):
+                    continue
+                expected = stick.expected_mute(member.id) if stick is not None else False
+                if member.voice.mute == expected:
+                    continue
+                try:
+                    await member.edit(mute=expected)
+                    result["drift_repaired"] += 1
+                except discord.HTTPException:
+                    result["repair_failed"] += 1
+        self.stats["sweeps"] += 1
+        for key, value in result.items():
+            self.stats[key] += value
+        return result
+
+    def summary(self) -> str:
+        """
+        Returns the totals of every sweep so far as one line of text.
+        """
+        return "mute reconciler " + " ".join(f"{key}={value}" for key, value in self.stats.items())
@@ -0,0 +1,56 @@
+import os
+
+# every setting read from the environment or .env, as name: (type, default)
+SETTINGS = {
+    "TOKEN": (str, None),
+    # e.g. "sqlite:json/state.db" to share sessions and guild settings between processes
+    "STATE_STORE": (str, None),
+    "STATE_STALE_AFTER": (float, 900.0),
+    # names this process among those sharing a store, so it keeps its sessions across restarts
+    "INSTANCE_ID": (str, "main"),
+    "SHUTDOWN_DEADLINE": (float, 25.0),
+    "RECONCILE_INTERVAL": (float, 60.0),
+    "RECONCILE_BATCH_SIZE": (int, 5),
+    # e.g. "INFO=1/20/100,WARNING=5/50/10" (LEVEL=per second/burst/sample one in N)
+    "LOG_LIMITS": (str, ""),
+    # path of the local admin console socket, unset to disable it
+    "ADMIN_SOCKET": (str, None),
+    # seconds the event loop may be blocked before the blocking stack is logged, 0 to disable
+    "LOOP_LAG_THRESHOLD": (float, 0.5),
+    # idle session threads kept for reuse, 0 to delete every thread when its session ends
+    "THREAD_POOL_SIZE": (int, 100),
+    "THREAD_POOL_IDLE": (float, 21600.0),
+    # "voice" caches only members in voice channels, "ondemand" also fetches a guild's
+    # members when a session starts there, "full" fetches every member at startup
+    "CACHE_POLICY": (str, "voice"),
+    # per-guild capacity limits, 0 to turn a limit off
+    "MAX_SESSIONS_PER_GUILD": (int, 25),
+    "MAX_QUEUE_LENGTH": (int, 200),
+    "MAX_STARTS_PER_MINUTE": (int, 30),
+    # seconds profiled when the bot receives SIGUSR1
+    "PROFILE_SECONDS": (float, 30.0),
+}
+
+def load_config(environ: dict = None) -> dict:
+    """
+    Reads the bot's settings.
+
+    Parameters:
+        environ (dict): The settings to read, e.g. for a benchmark. Defaults to
+        the process environment after loading .env.
+
+    Returns:
+        dict: Every setting in SETTINGS, parsed, with defaults for those unset.
+
+    Raises:
+        ValueError: If a setting can't be parsed as its type.
+    """
+    if environ is None:
+        from dotenv import load_dotenv
+        load_dotenv()
+        environ = os.environ
+    config = {}
+    for name, (kind, default) in SETTINGS.items():
+        value = environ.get(name)
+        config[name] = default if value is None else kind(value)
+    return config
@@ -0,0 +1,584 @@
+import argparse
+import asyncio
+import itertools
+import random
+import re
+import selectors
+import time
+from collections import Counter
+import discord
+import src.ts as ts
+import src.tsjson as tsjson
+import src.statestore as statestore
+import src.threadpool as threadpool
+import src.holdstats as holdstats
+import src.limits as limits
+
+MENTION = re.compile(r"<@(\d+)>")
+BOARD_HOLDER = re.compile(r"Holder: <@(\d+)>")
+
+# --- Virtual clock ---
+
+class VirtualSelector(selectors.DefaultSelector):
+    """
+    A selector that moves the loop's clock forward instead of waiting.
+
+    The event loop asks its selector to wait until the next timer is due. With
+    no real I/O pending, this selector jumps the virtual clock straight to that
+    timer, so sleeping tasks wake up without any real time passing.
+    """
+
+    def __init__(self, loop: "VirtualClockLoop"):
+        super().__init__()
+        self.loop = loop
+
+    def select(self, timeout=None):
+        events = super().select(0)
+        if events or timeout == 0:
+            return events
+        if timeout is None:
+            raise RuntimeError("Simulation stalled: every task is waiting and no timer is scheduled")
+        self.loop.now += timeout
+        return []
+
+class VirtualClockLoop(asyncio.SelectorEventLoop):
+    def __init__(self, start: float = 0.0):
+        """
+        Initializes the VirtualClockLoop.
+
+        An event loop whose clock only moves when every task is waiting, and
+        then jumps straight to the next timer. asyncio.sleep, asyncio.wait_for
+        and the Stick timeout timers all run on this clock.
+
+        Parameters:
+            start (float): The virtual time the loop starts at.
+        """
+        self.now = start
+        super().__init__(VirtualSelector(self))
+
+    def time(self) -> float:
+        return self.now
+
+# --- Fake Discord backend ---
+
+class Backend:
+    def __init__(self, latency: float = 0.0):
+        """
+        Initializes the Backend.
+
+        The backend stands in for the Discord API. It keeps the fake guilds,
+        channels, threads and members, counts the API calls made against them,
+        and makes each call take latency virtual seconds.
+
+        Parameters:
+            latency (float): Virtual seconds each API call takes.
+        """
+        self.latency = latency
+        self.calls = Counter()
+        self.events = Counter()
+        self.ids = itertools.count(1000)
+        self.guilds = {}
+        self.channels = {}
+        self.members = {}
+        self.board_holders = {}
+
+    async def request(self, route: str):
+        """
+        Records an API call and waits for its latency.
+
+        Parameters:
+            route (str): The name of the call.
+
+        Returns:
+            None
+        """
+        self.calls[route] += 1
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+
+    def on_message(self, content: str):
+        """
+        Lets the members mentioned in a thread message react to it, the same way
+        real members learn from the session thread that they hold the stick.
+
+        Parameters:
+            content (str): The message.
+
+        Returns:
+            None
+        """
+        for user_id in MENTION.findall(content):
+            member = self.members.get(int(user_id))
+            if member is None:
+                continue
+            if "claimed the stick" in content or "now has the stick" in content:
+                self.events["holds"] += 1
+                member.holding.set()
+            elif "has timed out" in content:
+                self.events["timeouts"] += 1
+                member.released.set()
+        if "Session ending" in content:
+            self.events["sessions_ended"] += 1
+
+    def on_board(self, message_id: int, content: str):
+        """
+        Lets members read a status board: the member it shows as the holder
+        learns they hold the stick, and the member it showed before learns they
+        no longer do.
+
+        Parameters:
+            message_id (int): The id of the board message.
+            content (str): The board's text.
+
+        Returns:
+            None
+        """
+        match = BOARD_HOLDER.search(content)
+        holder_id = int(match.group(1)) if match else None
+        previous_id = self.board_holders.get(message_id)
+        self.board_holders[message_id] = holder_id
+        if holder_id != previous_id:
+            if previous_id is not None and previous_id in self.members:
+                self.members[previous_id].released.set()
+            if holder_id is not None:
+                self.events["holds"] += 1
+        # a member who claimed again may be shown holding on consecutive boards
+        if holder_id is not None and holder_id in self.members:
+            self.members[holder_id].holding.set()
+
+class FakeRole:
+    def __init__(self, role_id: int):
+        self.id = role_id
+
+class FakeVoiceState:
+    def __init__(self, channel: "FakeVoiceChannel"):
+        self.channel = channel
+        self.mute = False
+        # members join a stage channel in its audience
+        self.suppress = channel.type == discord.ChannelType.stage_voice
+        self.requested_to_speak_at = None
+
+class FakeMember:
+    def __init__(self, backend: Backend, guild: "FakeGuild", member_id: int):
+        self.backend = backend
+        self.guild = guild
+        self.id = member_id
+        self.name = f"member{member_id}"
+        self.mention = f"<@{member_id}>"
+        self.voice = None
+        self.holding = asyncio.Event()
+        self.released = asyncio.Event()
+
+    async def edit(self, *, mute: bool = None, suppress: bool = None):
+        await self.backend.request("member.edit")
+        if self.voice is None:
+            return
+        if mute is not None:
+            self.voice.mute = mute
+        if suppress is not None:
+            self.voice.suppress = suppress
+
+class FakeMessage:
+    def __init__(self, backend: Backend, message_id: int):
+        self.backend = backend
+        self.id = message_id
+
+    async def edit(self, *, content: str):
+        await self.backend.request("message.edit")
+        self.backend.on_board(self.id, content)
+
+    async def pin(self):
+        await self.backend.request("message.pin")
+
+    async def delete(self):
+        await self.backend.request("message.delete")
+        self.backend.board_holders.pop(self.id, None)
+
+class FakeThread:
+    def __init__(self, backend: Backend, parent: "FakeTextChannel"):
+        self.backend = backend
+        self.id = next(backend.ids)
+        self.parent_id = parent.id
+        self.guild = parent.guild
+        self.archived = False
+        # the bot that created the thread
+        self.owner_id = 1
+        self.member_ids = {self.owner_id}
+
+    async def send(self, content: str, **kwargs) -> FakeMessage:
+        await self.backend.request("thread.send")
+        message = FakeMessage(self.backend, next(self.backend.ids))
+        if content.startswith("**Talking Stick**"):
+            self.backend.on_board(message.id, content)
+        else:
+            self.backend.on_message(content)
+        return message
+
+    def get_partial_message(self, message_id: int) -> FakeMessage:
+        return FakeMessage(self.backend, message_id)
+
+    async def fetch_members(self) -> list:
+        await self.backend.request("thread.fetch_members")
+        return [discord.Object(member_id) for member_id in self.member_ids]
+
+    async def add_user(self, member: FakeMember):
+        await self.backend.request("thread.add_user")
+        self.member_ids.add(member.id)
+
+    async def remove_user(self, member: FakeMember):
+        await self.backend.request("thread.remove_user")
+        self.member_ids.discard(member.id)
+
+    async def edit(self, *, archived: bool):
+        await self.backend.request("thread.edit")
+        self.archived = archived
+
+    async def delete(self):
+        await self.backend.request("thread.delete")
+        self.backend.channels.pop(self.id, None)
+        self.guild.threads.pop(self.id, None)
+
+class FakeTextChannel:
+    def __init__(self, backend: Backend, guild: "FakeGuild"):
+        self.backend = backend
+        self.guild = guild
+        self.id = next(backend.ids)
+        self.name = f"text{self.id}"
+
+    async def create_thread(self, **kwargs) -> FakeThread:
+        await self.backend.request("channel.create_thread")
+        thread = FakeThread(self.backend, self)
+        self.backend.channels[thread.id] = thread
+        self.guild.threads[thread.id] = thread
+        return thread
+
+class FakeVoiceChannel:
+    def __init__(self, backend: Backend, guild: "FakeGuild", stage: bool = False):
+        self.backend = backend
+        self.guild = guild
+        self.id = next(backend.ids)
+        self.name = f"voice{self.id}"
+        self.type = discord.ChannelType.stage_voice if stage else discord.ChannelType.voice
+        self.members = []
+        # target id: (allow, deny)
+        self.overwrite_pairs = {}
+
+    @property
+    def overwrites(self) -> dict:
+        targets = {}
+        for target_id, (allow, deny) in self.overwrite_pairs.items():
+            target = self.guild.default_role if target_id == self.guild.id else self.guild.get_member(target_id) or discord.Object(target_id)
+            targets[target] = discord.PermissionOverwrite.from_pair(discord.Permissions(allow), discord.Permissions(deny))
+        return targets
+
+    def overwrites_for(self, target) -> discord.PermissionOverwrite:
+        allow, deny = self.overwrite_pairs.get(target.id, (0, 0))
+        return discord.PermissionOverwrite.from_pair(discord.Permissions(allow), discord.Permissions(deny))
+
+    async def set_permissions(self, target, *, overwrite: discord.PermissionOverwrite):
+        await self.backend.request("channel.set_permissions")
+        if overwrite is None:
+            self.overwrite_pairs.pop(target.id, None)
+        else:
+            self.overwrite_pairs[target.id] = tuple(permissions.value for permissions in overwrite.pair())
+
+class FakeGuild:
+    def __init__(self, backend: Backend):
+        self.backend = backend
+        self.id = next(backend.ids)
+        self.name = f"guild{self.id}"
+        self.default_role = FakeRole(self.id)
+        self.chunked = True
+        self.threads = {}
+
+    def get_thread(self, thread_id: int) -> FakeThread:
+        return self.threads.get(thread_id)
+
+    def get_member(self, user_id: int) -> FakeMember:
+        return self.backend.members.get(user_id)
+
+    async def fetch_member(self, user_id: int) -> FakeMember:
+        await self.backend.request("guild.fetch_member")
+        return self.backend.members[user_id]
+
+class FakeClient:
+    def __init__(self, backend: Backend):
+        self.backend = backend
+        self.intents = discord.Intents.default()
+
+    def get_guild(self, guild_id: int) -> FakeGuild:
+        return self.backend.guilds.get(guild_id)
+
+    def get_channel(self, channel_id: int):
+        return self.backend.channels.get(channel_id)
+
+    def get_partial_messageable(self, channel_id: int, **kwargs):
+        return self.backend.channels.get(channel_id)
+
+    async def fetch_channel(self, channel_id: int):
+        await self.backend.request("client.fetch_channel")
+        channel = self.backend.channels.get(channel_id)
+        if channel is None:
+            raise LookupError(f"Unknown channel {channel_id}")
+        return channel
+
+class FakeResponse:
+    def __init__(self, backend: Backend):
+        self.backend = backend
+        self.done = False
+
+    async def send_message(self, content: str, **kwargs):
+        await self.backend.request("interaction.respond")
+        self.done = True
+        if content == "Session started!":
+            self.backend.events["sessions_started"] += 1
+
+    def is_done(self) -> bool:
+        return self.done
+
+class FakeInteraction:
+    def __init__(self, backend: Backend, member: FakeMember, channel: FakeTextChannel):
+        self.user = member
+        self.guild = member.guild
+        self.channel = channel
+        self.response = FakeResponse(backend)
+
+# --- Workload ---
+
+class Simulation:
+    def __init__(self, seed: int = 0, guilds: int = 10, channels: int = 5, members: int = 8, duration: float = 3600,
+                 timeout: int = 120, mean_hold: float = 90, mean_idle: float = 600, latency: float = 0.05,
+                 mode: str = ts.MUTE, thread_pool: bool = True, patience: float = 3600, adaptive: tuple = None,
+                 guild_limits: tuple = None, board: int = 0):
+        """
+        Initializes the Simulation.
+
+        Every simulated member sits in a voice channel, waits a random while,
+        claims the stick with /tsclaim, talks for a random while once the
+        session thread says they hold it, and then passes it with /tspass. A
+        member who talks for longer than the guild timeout is timed out by the
+        real Stick timer instead. A member who is still not holding the stick
+        patience seconds after claiming gives up on that claim, which is
+        counted as a lost claim. Idle and talk times are exponentially
+        distributed and drawn from a generator seeded with seed, so a run is
+        the same every time.
+
+        Parameters:
+            seed (int): The random seed.
+            guilds (int): The number of guilds.
+            channels (int): The number of voice channels per guild.
+            members (int): The number of members per voice channel.
+            duration (float): Virtual seconds during which members claim.
+            timeout (int): The guild stick timeout in seconds, 0 for none.
+            mean_hold (float): Mean seconds a member talks before passing.
+            mean_idle (float): Mean seconds a member waits before claiming again.
+            latency (float): Virtual seconds each Discord API call takes.
+            mode (str): The session mode, ts.MUTE or ts.AUDIENCE, or ts.STAGE to
+            make every voice channel a stage channel.
+            thread_pool (bool): Whether session threads are pooled.
+            patience (float): Seconds a member waits for the stick after claiming.
+            adaptive (tuple): The target wait, floor and ceiling of an adaptive
+            timeout, or None to use the fixed timeout.
+            guild_limits (tuple): The sessions, queue length and starts per
+            minute limits of each guild, or None for no limits.
+            board (int): The status board interval, 0 for a message per event.
+        """
+        self.random = random.Random(seed)
+        self.seed = seed
+        self.duration = duration
+        self.timeout = timeout
+        self.mean_hold = mean_hold
+        self.mean_idle = mean_idle
+        self.mode = mode
+        self.patience = patience
+        self.adaptive = adaptive
+        self.board = board
+        self.backend = Backend(latency)
+        self.client = FakeClient(self.backend)
+        self.store = statestore.MemoryStateStore()
+        self.threads = threadpool.ThreadPool(self.client) if thread_pool else None
+        self.limits = limits.GuildLimits(*guild_limits) if guild_limits is not None else limits.GuildLimits()
+        self.stick_manager = ts.StickManager(self.client, self.store, self.threads, self.limits)
+        self.voice_channels = []
+        self.guild_count = guilds
+        self.channel_count = channels
+        self.member_count = members
+        self.max_queue = 0
+
+    def build(self):
+        """
+        Creates the fake guilds, channels and members and the guild settings.
+
+        Returns:
+            None
+        """
+        tsjson.use_store(self.store)
+        holdstats.clear_priors()
+        for _ in range(self.guild_count):
+            guild = FakeGuild(self.backend)
+            self.backend.guilds[guild.id] = guild
+            tsjson.update_guild(guild, lambda settings: settings.update(stick_timeout=self.timeout, session_mode=self.mode if self.mode != ts.STAGE else ts.MUTE))
+            if self.adaptive is not None:
+                tsjson.set_adaptive_timeout(guild, *self.adaptive)
+            tsjson.set_status_board(guild, self.board)
+            text = FakeTextChannel(self.backend, guild)
+            self.backend.channels[text.id] = text
+            for _ in range(self.channel_count):
+                voice = FakeVoiceChannel(self.backend, guild, stage=self.mode == ts.STAGE)
+                self.backend.channels[voice.id] = voice
+                for _ in range(self.member_count):
+                    member = FakeMember(self.backend, guild, next(self.backend.ids))
+                    member.voice = FakeVoiceState(voice)
+                    voice.members.append(member)
+                    self.backend.members[member.id] = member
+                self.voice_channels.append((voice, text))
+
+    async def claim(self, member: FakeMember, text: FakeTextChannel) -> bool:
+        """
+        Runs /tsclaim for a member the same way the bot's command handler does.
+
+        Returns:
+            bool: False if the claim was rejected or failed.
+        """
+        voice = member.voice.channel
+        self.backend.events["claims"] += 1
+        try:
+            stick = self.stick_manager.add_stick(voice)
+            await stick.claim(FakeInteraction(self.backend, member, text))
+        except limits.CapacityError as e:
+            self.limits.record(e)
+            self.backend.events["claims_rejected"] += 1
+            return False
+        except Exception:
+            self.backend.events["claim_errors"] += 1
+            await stick.kill_session()
+            self.stick_manager.del_stick(voice)
+            return False
+        self.max_queue = max(self.max_queue, stick.queue.size())
+        return True
+
+    async def pass_stick(self, member: FakeMember, text: FakeTextChannel):
+        """
+        Runs /tspass for a member the same way the bot's command handler does.
+        """
+        stick = self.stick_manager.get_stick_by_channel(member.voice.channel)
+        if stick is None:
+            return
+        self.backend.events["passes"] += 1
+        try:
+            await stick.pass_stick(FakeInteraction(self.backend, member, text))
+        except Exception:
+            self.backend.events["pass_errors"] += 1
+
+    async def member_loop(self, member: FakeMember, text: FakeTextChannel, rng: random.Random):
+        """
+        Plays one member: idle, claim, wait for the stick, talk, pass, repeat.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(rng.expovariate(1 / self.mean_idle))
+            if loop.time() >= self.duration:
+                return
+            member.holding.clear()
+            member.released.clear()
+            if not await self.claim(member, text):
+                continue
+            try:
+                await asyncio.wait_for(member.holding.wait(), self.patience)
+            except asyncio.TimeoutError:
+                # the claim was lost, e.g. to a session ending at the same time
+                self.backend.events["claims_lost"] += 1
+                continue
+            try:
+                await asyncio.wait_for(member.released.wait(), rng.expovariate(1 / self.mean_hold))
+            except asyncio.TimeoutError:
+                await self.pass_stick(member, text)
+
+    async def run(self) -> dict:
+        """
+        Runs the workload until every member has stopped claiming and every
+        queue has been worked through, then ends the remaining sessions.
+
+        Returns:
+            dict: The simulation's results.
+        """
+        self.build()
+        loop = asyncio.get_running_loop()
+        # errors in tasks nobody awaits, such as the stick timers, are counted
+        loop.set_exception_handler(lambda loop, context: self.backend.events.update(task_errors=1))
+        started = time.perf_counter()
+        members = []
+        for voice, text in self.voice_channels:
+            for member in voice.members:
+                rng = random.Random(self.random.getrandbits(64))
+                members.append(asyncio.create_task(self.member_loop(member, text, rng)))
+        await asyncio.gather(*members)
+        for stick in list(self.stick_manager.sticks.values()):
+            if stick.active:
+                await stick.kill_session()
+        leftover = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in leftover:
+            task.cancel()
+        await asyncio.gather(*leftover, return_exceptions=True)
+        elapsed = time.perf_counter() - started
+        return {
+            "seed": self.seed,
+            "virtual_seconds": loop.time(),
+            "wall_seconds": elapsed,
+            "sessions": len(self.voice_channels),
+            "members": len(self.backend.members),
+            "max_queue": self.max_queue,
+            "rejected": dict(self.limits.rejected),
+            "events": dict(sorted(self.backend.events.items())),
+            "api_calls": dict(sorted(self.backend.calls.items())),
+        }
+
+def simulate(**options) -> dict:
+    """
+    Runs a Simulation on a fresh virtual clock loop.
+
+    Parameters:
+        options: The Simulation's keyword arguments.
+
+    Returns:
+        dict: The simulation's results.
+    """
+    loop = VirtualClockLoop()
+    try:
+        return loop.run_until_complete(Simulation(**options).run())
+    finally:
+        loop.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run talking stick sessions against a fake Discord on a virtual clock.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--guilds", type=int, default=10)
+    parser.add_argument("--channels", type=int, default=5, help="voice channels per guild")
+    parser.add_argument("--members", type=int, default=8, help="members per voice channel")
+    parser.add_argument("--hours", type=float, default=1, help="virtual hours during which members claim")
+    parser.add_argument("--timeout", type=int, default=120, help="guild stick timeout in seconds")
+    parser.add_argument("--adaptive", type=int, nargs=3, metavar=("TARGET_WAIT", "FLOOR", "CEILING"), help="use an adaptive timeout instead of --timeout")
+    parser.add_argument("--limits", type=int, nargs=3, metavar=("SESSIONS", "QUEUE", "STARTS_PER_MINUTE"), help="per-guild capacity limits, 0 for no limit")
+    parser.add_argument("--board", type=int, default=0, metavar="INTERVAL", help="use a status board edited at most every INTERVAL seconds")
+    parser.add_argument("--mean-hold", type=float, default=90, help="mean seconds a member talks before passing")
+    parser.add_argument("--mean-idle", type=float, default=600, help="mean seconds between a member's claims")
+    parser.add_argument("--latency", type=float, default=0.05, help="virtual seconds per Discord API call")
+    parser.add_argument("--mode", choices=(ts.MUTE, ts.AUDIENCE, ts.STAGE), default=ts.MUTE, help="session mode, stage to run every session in a stage channel")
+    parser.add_argument("--patience", type=float, default=3600, help="seconds a member waits for the stick before giving up on a claim")
+    parser.add_argument("--no-thread-pool", action="store_true")
+    args = parser.parse_args()
+    result = simulate(seed=args.seed, guilds=args.guilds, channels=args.channels, members=args.members,
+                      duration=args.hours * 3600, timeout=args.timeout, mean_hold=args.mean_hold,
+                      mean_idle=args.mean_idle, latency=args.latency, mode=args.mode,
+                      thread_pool=not args.no_thread_pool, patience=args.patience,
+                      adaptive=args.adaptive, guild_limits=args.limits, board=args.board)
+    print(f"Simulated {result['virtual_seconds'] / 3600:.2f} hours in {result['wall_seconds']:.2f} seconds "
+          f"({result['virtual_seconds'] / max(result['wall_seconds'], 1e-9):.0f}x), seed {result['seed']}")
+    print(f"{result['sessions']} voice channels, {result['members']} members, longest queue {result['max_queue']}")
+    if result["rejected"]:
+        print("Rejected claims: " + ", ".join(f"{limit}={count}" for limit, count in result["rejected"].items()))
+    print("Events: " + ", ".join(f"{name}={count}" for name, count in result["events"].items()))
+    print("API calls: " + ", ".join(f"{name}={count}" for name, count in result["api_calls"].items()))
+
+if __name__ == "__main__":
+    main()
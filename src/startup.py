@@ -0,0 +1,105 @@
+import json
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+# the phases of a start, in the order they happen
+IMPORTS = "imports"
+CONFIG = "config"
+LOGGER = "logger"
+SETUP = "setup"
+LOGIN = "login"
+COMMAND_SYNC = "command_sync"
+CACHE_READY = "cache_ready"
+PHASES = (IMPORTS, CONFIG, LOGGER, SETUP, LOGIN, COMMAND_SYNC, CACHE_READY)
+
+class StartupTimer:
+    def __init__(self, started: float = None):
+        """
+        Initializes the StartupTimer.
+
+        The timer records how long each phase of a start takes, from the first
+        import to the client's cache being ready, so a slow start can be pinned
+        on the phase that caused it instead of being guessed at.
+
+        Parameters:
+            started (float): The time.perf_counter() at which the process
+            started, defaults to now.
+        """
+        self.started = time.perf_counter() if started is None else started
+        self.durations = {}
+        self.open = {}
+        self.reported = False
+
+    def begin(self, phase: str):
+        """
+        Starts timing a phase.
+
+        Parameters:
+            phase (str): One of PHASES.
+
+        Returns:
+            None
+        """
+        self.open[phase] = time.perf_counter()
+
+    def end(self, phase: str):
+        """
+        Stops timing a phase. Phases that were never begun are ignored, e.g.
+        command sync after a reconnect.
+
+        Parameters:
+            phase (str): One of PHASES.
+
+        Returns:
+            None
+        """
+        began = self.open.pop(phase, None)
+        if began is not None:
+            self.durations[phase] = self.durations.get(phase, 0.0) + time.perf_counter() - began
+
+    @contextmanager
+    def phase(self, phase: str):
+        """
+        Times the body of a with statement as a phase.
+
+        Parameters:
+            phase (str): One of PHASES.
+        """
+        self.begin(phase)
+        try:
+            yield
+        finally:
+            self.end(phase)
+
+    def elapsed(self) -> float:
+        """
+        Returns the seconds since the process started.
+        """
+        return time.perf_counter() - self.started
+
+    def summary(self) -> str:
+        """
+        Returns the time each phase took as one line of text.
+        """
+        phases = ", ".join(f"{phase}={self.durations[phase]:.2f}s" for phase in PHASES if phase in self.durations)
+        return f"Started in {self.elapsed():.2f}s: {phases}"
+
+    def write(self, path: str = "logs/startup.jsonl"):
+        """
+        Appends the time each phase took to a file as one line of JSON, so
+        starts can be compared across releases.
+
+        Parameters:
+            path (str): The file to append to.
+
+        Returns:
+            None
+        """
+        path = Path(path)
+        path.parent.mkdir(exist_ok=True)
+        record = {"time": datetime.now().isoformat(timespec="seconds"), "total": round(self.elapsed(), 3)}
+        record.update((phase, round(self.durations[phase], 3)) for phase in PHASES if phase in self.durations)
+        with open(path, "a") as f:
+            f.write(json.dumps(record) + "\n")
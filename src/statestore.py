@@ -0,0 +1,309 @@
+import json
+import os
+import socket
+import threading
+
+GUILDS = "guilds"
+SESSIONS = "sessions"
+# the stored value of a deleted record
+TOMBSTONE = json.dumps(None)
+
+_token = None
+# the open lock file that reserves this process' instance id
+_instance_lock = None
+
+class OwnershipError(Exception):
+    """
+    Raised when a process writes a session record that another process owns.
+    """
+
+def process_token() -> str:
+    """
+    Returns a token identifying this process.
+
+    The token is stored as the owner of session records so processes sharing a
+    store can tell whose sessions are whose. Until claim_instance() succeeds it
+    includes the process id, so it is unique but changes on every restart.
+
+    Returns:
+        str: e.g. "host:main" or "host:1234".
+    """
+    global _token
+    if _token is None:
+        _token = f"{socket.gethostname()}:{os.getpid()}"
+    return _token
+
+def claim_instance(instance: str, directory: str = "json") -> bool:
+    """
+    Makes process_token() the host name and a stable instance id, so a process
+    restarted with the same id recognises its own sessions in the store.
+
+    The id is reserved with a lock on a file in directory for as long as the
+    process runs. If another running process holds it, the token keeps the
+    process id, so two processes never share a token.
+
+    Parameters:
+        instance (str): The instance id, unique among the processes on the host.
+        directory (str): Where the lock file is kept.
+
+    Returns:
+        bool: True if the instance id was reserved, False if it is in use.
+    """
+    import fcntl
+    global _token, _instance_lock
+    os.makedirs(directory, exist_ok=True)
+    lock = open(os.path.join(directory, f"instance-{instance}.lock"), "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock.close()
+        return False
+    _instance_lock = lock
+    _token = f"{socket.gethostname()}:{instance}"
+    return True
+
+class StateStore:
+    """
+    Base class for shared state stores.
+
+    A store holds JSON-serialisable records grouped in namespaces (GUILDS for
+    guild settings, SESSIONS for talking stick sessions). Every record has a
+    version that is bumped on each write, and all writes are compare-and-set
+    against the version the writer last read. A version of 0 means the record
+    has never existed.
+
+    Deleting a record leaves a tombstone that keeps counting its versions, so
+    a key's version only ever goes up. A writer holding a version read before
+    the delete can then never overwrite a record created after it. Tombstones
+    read as None and are left out of items(); there is at most one per key.
+
+    Stores whose reads and writes block on I/O set blocking, so callers on
+    the event loop know to run them in a worker thread.
+    """
+    blocking = False
+
+    def get(self, namespace: str, key: str) -> tuple:
+        """
+        Reads a record.
+
+        Parameters:
+            namespace (str): The namespace of the record.
+            key (str): The key of the record.
+
+        Returns:
+            tuple: The record (or None if it doesn't exist) and its version,
+            which is the tombstone's version for a deleted record.
+        """
+        raise NotImplementedError
+
+    def compare_and_set(self, namespace: str, key: str, value: dict, expected_version: int) -> bool:
+        """
+        Writes a record if its version still matches.
+
+        Parameters:
+            namespace (str): The namespace of the record.
+            key (str): The key of the record.
+            value (dict): The new record, or None to delete it.
+            expected_version (int): The version the caller last read, including
+            a deleted record's, or 0 if the record has never existed.
+
+        Returns:
+            bool: True if the write happened, False if the record changed first.
+        """
+        raise NotImplementedError
+
+    def items(self, namespace: str) -> dict:
+        """
+        Reads every record in a namespace.
+
+        Parameters:
+            namespace (str): The namespace to read.
+
+        Returns:
+            dict: The records keyed by key, each as a (record, version) tuple.
+        """
+        raise NotImplementedError
+
+    def update(self, namespace: str, key: str, update, retries: int = 16) -> dict:
+        """
+        Applies a function to a record with compare-and-set, retrying on conflicts.
+
+        Parameters:
+            namespace (str): The namespace of the record.
+            key (str): The key of the record.
+            update (callable): Takes the current record (or None) and returns the
+            new record, or None to delete it.
+            retries (int): How many conflicting writes to tolerate.
+
+        Returns:
+            dict: The record that was written.
+
+        Raises:
+            RuntimeError: If the record kept changing underneath the update.
+        """
+        for _ in range(retries):
+            record, version = self.get(namespace, key)
+            new_record = update(record)
+            if record is None and new_record is None:
+                return None
+            if self.compare_and_set(namespace, key, new_record, version):
+                return new_record
+        raise RuntimeError(f"Too many conflicting writes to {namespace}/{key}")
+
+    def add(self, namespace: str, key: str, value: dict, retries: int = 16) -> bool:
+        """
+        Writes a record unless it exists, whether or not it existed before.
+
+        Parameters:
+            namespace (str): The namespace of the record.
+            key (str): The key of the record.
+            value (dict): The new record.
+            retries (int): How many conflicting writes to tolerate.
+
+        Returns:
+            bool: True if the record was written, False if it already exists.
+
+        Raises:
+            RuntimeError: If the record kept changing underneath the write.
+        """
+        for _ in range(retries):
+            record, version = self.get(namespace, key)
+            if record is not None:
+                return False
+            if self.compare_and_set(namespace, key, value, version):
+                return True
+        raise RuntimeError(f"Too many conflicting writes to {namespace}/{key}")
+
+    def delete(self, namespace: str, key: str) -> None:
+        """
+        Deletes a record regardless of its version.
+
+        Parameters:
+            namespace (str): The namespace of the record.
+            key (str): The key of the record.
+        """
+        self.update(namespace, key, lambda record: None)
+
+    def close(self) -> None:
+        """
+        Releases any resources held by the store.
+        """
+
+class MemoryStateStore(StateStore):
+    """
+    A state store kept in this process' memory.
+
+    Records are copied in and out through JSON so callers can never share
+    mutable state with the store, matching the other implementations. A
+    tombstone is kept as JSON null.
+    """
+
+    def __init__(self):
+        """
+        Initializes the MemoryStateStore.
+
+        This constructor creates an empty store and a threading.Lock to protect it.
+        """
+        self.records = {}
+        self.lock = threading.Lock()
+
+    def get(self, namespace: str, key: str) -> tuple:
+        with self.lock:
+            if (namespace, key) not in self.records:
+                return None, 0
+            value, version = self.records[(namespace, key)]
+            return json.loads(value), version
+
+    def compare_and_set(self, namespace: str, key: str, value: dict, expected_version: int) -> bool:
+        with self.lock:
+            _, version = self.records.get((namespace, key), (None, 0))
+            if version != expected_version:
+                return False
+            self.records[(namespace, key)] = (json.dumps(value), version + 1)
+            return True
+
+    def items(self, namespace: str) -> dict:
+        with self.lock:
+            return {key: (json.loads(value), version) for (ns, key), (value, version) in self.records.items() if ns == namespace and value != TOMBSTONE}
+
+class SQLiteStateStore(StateStore):
+    """
+    A state store backed by a SQLite database file.
+
+    Several processes on the same host can share one database. The database
+    runs in WAL mode and every compare-and-set is a single conditional
+    statement, so concurrent writers never overwrite each other. A tombstone
+    is a row whose value is JSON null.
+    """
+    blocking = True
+
+    def __init__(self, path: str, timeout: float = 10.0):
+        """
+        Initializes the SQLiteStateStore.
+
+        Parameters:
+            path (str): The path of the database file. It is created if it does
+            not exist.
+            timeout (float): How long, in seconds, to wait for a locked database.
+        """
+        # imported here so bots on the default json store don't load sqlite3
+        import sqlite3
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, version INTEGER NOT NULL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+
+    def get(self, namespace: str, key: str) -> tuple:
+        with self.lock:
+            row = self.conn.execute("SELECT value, version FROM state WHERE namespace = ? AND key = ?", (namespace, key)).fetchone()
+        if row is None:
+            return None, 0
+        return json.loads(row[0]), row[1]
+
+    def compare_and_set(self, namespace: str, key: str, value: dict, expected_version: int) -> bool:
+        with self.lock:
+            if expected_version == 0:
+                cursor = self.conn.execute("INSERT OR IGNORE INTO state (namespace, key, value, version) VALUES (?, ?, ?, 1)", (namespace, key, json.dumps(value)))
+            else:
+                cursor = self.conn.execute(
+                    "UPDATE state SET value = ?, version = version + 1 WHERE namespace = ? AND key = ? AND version = ?",
+                    (json.dumps(value), namespace, key, expected_version),
+                )
+            return cursor.rowcount == 1
+
+    def items(self, namespace: str) -> dict:
+        with self.lock:
+            rows = self.conn.execute("SELECT key, value, version FROM state WHERE namespace = ? AND value != ?", (namespace, TOMBSTONE)).fetchall()
+        return {key: (json.loads(value), version) for key, value, version in rows}
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+def open_store(url: str) -> StateStore:
+    """
+    Opens a state store from a URL.
+
+    Supported URLs are "memory" and "sqlite:<path>".
+
+    Parameters:
+        url (str): The store URL, or None.
+
+    Returns:
+        StateStore: The opened store, or None if no URL was given.
+
+    Raises:
+        ValueError: If the URL is not recognised.
+    """
+    if not url:
+        return None
+    if url == "memory":
+        return MemoryStateStore()
+    if url.startswith("sqlite:"):
+        return SQLiteStateStore(url[len("sqlite:"):])
+    raise ValueError(f"Unknown state store: {url}")
@@ -1,10 +1,133 @@
 import logging
+import threading
+import time
 from datetime import date
 from pathlib import Path
 
 
+class LogLimit:
+    __slots__ = ("rate", "burst", "sample")
+
+    def __init__(self, rate: float, burst: int, sample: int = 0):
+        """
+        The rate limit applied to one event type at one log level.
+
+        Parameters:
+            rate (float): The number of messages per second let through once the
+            burst is used up.
+            burst (int): The number of messages let through back to back.
+            sample (int): While limited, let through one in every sample
+            messages anyway. 0 lets none through.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.sample = sample
+
+    def __repr__(self):
+        return f"LogLimit(rate={self.rate}, burst={self.burst}, sample={self.sample})"
+
+DEFAULT_LIMITS = {
+    logging.INFO: LogLimit(rate=1, burst=20, sample=100),
+    logging.WARNING: LogLimit(rate=5, burst=50, sample=10),
+}
+
+def parse_limits(text: str) -> dict:
+    """
+    Parses log limits from a string such as "INFO=1/20/100,WARNING=5/50/10".
+
+    Each entry is LEVEL=rate/burst/sample. Levels not mentioned keep their
+    default limit.
+
+    Parameters:
+        text (str): The limits to parse.
+
+    Returns:
+        dict: The LogLimit for each level.
+
+    Raises:
+        ValueError: If an entry names an unknown level or can't be parsed.
+    """
+    limits = dict(DEFAULT_LIMITS)
+    for entry in filter(None, (part.strip() for part in text.split(","))):
+        level, values = entry.split("=")
+        # getLevelName gives the number of a known level and a string otherwise
+        number = logging.getLevelName(level.strip().upper())
+        if not isinstance(number, int):
+            raise ValueError(f"Unknown log level {level.strip()!r} in LOG_LIMITS entry {entry!r}")
+        rate, burst, sample = values.split("/")
+        limits[number] = LogLimit(float(rate), int(burst), int(sample))
+    return limits
+
+class RateLimiter:
+    def __init__(self, limits: dict, summary_interval: float = 60):
+        """
+        Decides which event messages are logged.
+
+        Every (event, level) pair gets its own token bucket, sized by the limit
+        for that level. Levels without a limit are never suppressed.
+
+        Parameters:
+            limits (dict): The LogLimit for each log level.
+            summary_interval (float): The minimum number of seconds between two
+            "suppressed" summaries for the same event.
+        """
+        self.limits = limits
+        self.summary_interval = summary_interval
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def allow(self, event: str, level: int) -> tuple:
+        """
+        Takes a token for an event message.
+
+        Parameters:
+            event (str): The event type, e.g. "voice.join".
+            level (int): The log level of the message.
+
+        Returns:
+            tuple: Whether to log the message, and the number of suppressed
+            messages to summarise now (0 if no summary is due).
+        """
+        limit = self.limits.get(level)
+        if limit is None:
+            return True, 0
+        now = time.monotonic()
+        with self.lock:
+            # tokens, last refill, suppressed since last summary, last summary, seen while limited
+            bucket = self.buckets.setdefault((event, level), [limit.burst, now, 0, now, 0])
+            bucket[0] = min(limit.burst, bucket[0] + (now - bucket[1]) * limit.rate)
+            bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                allowed = True
+            else:
+                bucket[4] += 1
+                allowed = limit.sample > 0 and bucket[4] % limit.sample == 0
+                if not allowed:
+                    bucket[2] += 1
+            suppressed = 0
+            if bucket[2] and now - bucket[3] >= self.summary_interval:
+                suppressed, bucket[2], bucket[3] = bucket[2], 0, now
+            return allowed, suppressed
+
+    def drain(self) -> list:
+        """
+        Collects the suppressed counts of every event and resets them.
+
+        Returns:
+            list: (event, level, suppressed count) for every event with
+            suppressed messages.
+        """
+        now = time.monotonic()
+        with self.lock:
+            pending = [(event, level, bucket[2]) for (event, level), bucket in self.buckets.items() if bucket[2]]
+            for (event, level), bucket in self.buckets.items():
+                if bucket[2]:
+                    bucket[2], bucket[3] = 0, now
+            return pending
+
 class StickLogger(logging.Logger):
-    def __init__(self):
+    def __init__(self, limits: dict = None, summary_interval: float = 60):
         """
         Initialize the logger.
 
@@ -15,6 +138,13 @@ class StickLogger(logging.Logger):
 
         The logger will also log to the console.
 
+        Messages logged with an event type are rate limited per event type and
+        level, and a "N similar messages suppressed" summary is logged for those
+        that were dropped. Messages are formatted %-style only once they are
+        actually emitted.
+
+        :param limits: The LogLimit for each level, defaults to DEFAULT_LIMITS.
+        :param summary_interval: Minimum seconds between summaries for an event.
         :return: None
         """
         
@@ -22,25 +152,59 @@ class StickLogger(logging.Logger):
             name="StickLogger",
             level=logging.INFO,
         )
+        self.limiter = RateLimiter(DEFAULT_LIMITS if limits is None else limits, summary_interval)
         self.date = date.today()
         self.log_file = Path(f"logs/{self.date}.log")
         self.log_file.touch()
 
         file_handler = logging.FileHandler(self.log_file)
-<<<<<<< HEAD
-        file_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
-        self.addHandler(file_handler)
-
-=======
         file_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s     %(message)s", datefmt='%Y-%m-%d %H:%M:%S'))
         self.addHandler(file_handler)
         
->>>>>>> dev
         console_handler = logging.StreamHandler()
         console_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s     %(message)s", datefmt='%Y-%m-%d %H:%M:%S'))
         self.addHandler(console_handler)
         
-    def log_info(self, message):
+    def log_event(self, level: int, message, *args, event: str = None):
+        """
+        Log a message, rate limited by its event type.
+
+        Nothing is formatted unless the message is emitted. Messages without an
+        event type are never rate limited.
+
+        Parameters:
+            level (int): The log level of the message.
+            message (str): The message to be logged, %-style.
+            args: The values for the message's placeholders.
+            event (str): The event type the message is rate limited by.
+
+        Returns:
+            None
+        """
+        if not self.isEnabledFor(level):
+            return
+        if event is not None:
+            allowed, suppressed = self.limiter.allow(event, level)
+            if suppressed:
+                self._log(level, "%d similar %s messages suppressed", (suppressed, event))
+            if not allowed:
+                return
+        self._log(level, message, args)
+
+    def flush_suppressed(self):
+        """
+        Log a summary for every event type that has suppressed messages.
+
+        This is called periodically so events that have gone quiet still get
+        their summary.
+
+        Returns:
+            None
+        """
+        for event, level, suppressed in self.limiter.drain():
+            self.log(level, "%d similar %s messages suppressed", suppressed, event)
+
+    def log_info(self, message, *args, event: str = None):
         """
         Log an informational message.
 
@@ -49,14 +213,16 @@ class StickLogger(logging.Logger):
 
         Parameters:
             message (str): The message to be logged.
+            args: The values for the message's %-style placeholders.
+            event (str): The event type to rate limit the message by.
 
         Returns:
             None
         """
 
-        self.info(message)
+        self.log_event(logging.INFO, message, *args, event=event)
     
-    def log_warning(self, message):
+    def log_warning(self, message, *args, event: str = None):
         """
         Log a warning message.
 
@@ -65,14 +231,16 @@ class StickLogger(logging.Logger):
 
         Parameters:
             message (str): The message to be logged.
+            args: The values for the message's %-style placeholders.
+            event (str): The event type to rate limit the message by.
 
         Returns:
             None
         """
 
-        self.warning(message)
+        self.log_event(logging.WARNING, message, *args, event=event)
     
-    def log_error(self, message):
+    def log_error(self, message, *args, event: str = None):
         """
         Log an error message.
 
@@ -81,8 +249,10 @@ class StickLogger(logging.Logger):
 
         Parameters:
             message (str): The message to be logged.
+            args: The values for the message's %-style placeholders.
+            event (str): The event type to rate limit the message by.
 
         Returns:
             None
         """
-        self.error(message)
\ No newline at end of file
+        self.log_event(logging.ERROR, message, *args, event=event)
\ No newline at end of file
@@ -1,54 +1,105 @@
+import sys
 import threading
+import time
 import discord
+import src.limits as limits
+
+class QueueEntry:
+    """
+    A compact record of a queued user.
+
+    Only plain ids and the enqueue time are kept, so a queued user does not pin
+    the member, the interaction or any of discord.py's cached objects. Entries
+    are resolved back into live objects through the client cache when needed.
+    """
+    __slots__ = ("user_id", "guild_id", "enqueued_at")
+
+    def __init__(self, user_id: int, guild_id: int, enqueued_at: float = None):
+        """
+        Initializes the QueueEntry.
+
+        Parameters:
+            user_id (int): The id of the queued user.
+            guild_id (int): The id of the guild the user was queued in.
+            enqueued_at (float): The time.monotonic() timestamp of when the user
+            was queued. Defaults to now.
+        """
+        self.user_id = user_id
+        self.guild_id = guild_id
+        self.enqueued_at = time.monotonic() if enqueued_at is None else enqueued_at
+
+    def retained_bytes(self) -> int:
+        """
+        Returns the number of bytes retained by the entry and its values.
+        """
+        return sys.getsizeof(self) + sys.getsizeof(self.user_id) + sys.getsizeof(self.guild_id) + sys.getsizeof(self.enqueued_at)
+
+    def waited(self) -> float:
+        """
+        Returns how long, in seconds, the user has been queued.
+        """
+        return time.monotonic() - self.enqueued_at
+
+    def __repr__(self):
+        return f"QueueEntry(user_id={self.user_id}, guild_id={self.guild_id}, enqueued_at={self.enqueued_at})"
 
 class StickQueue:
-    def __init__(self):
+    __slots__ = ("queue", "lock", "version", "max_length")
+
+    def __init__(self, max_length: int = 0):
         """
         Initializes the StickQueue.
 
         This constructor creates an empty queue and a threading.Lock to protect it.
+        The version is bumped on every change so views of the queue can be cached.
+
+        Parameters:
+            max_length (int): The most users the queue holds, 0 for no limit.
         """
         self.queue = []
         self.lock = threading.Lock()
-    
-<<<<<<< HEAD
-    def add(self, user: discord.User):
-=======
-    def add(self, user: discord.User, interaction: discord.Interaction):
->>>>>>> dev
+        self.version = 0
+        self.max_length = max_length
+
+    def add(self, user: discord.Member):
         """
         Adds a user to the queue.
 
+        Only the user's id, guild id and the enqueue time are stored.
+
         Parameters:
-            user (discord.User): The user to add.
+            user (discord.Member): The user to add.
+
+        Raises:
+            limits.CapacityError: If the queue is full.
         """
         with self.lock:
-<<<<<<< HEAD
-            self.queue.append(user)
-=======
-            self.queue.append({"user": user, "interaction": interaction})
->>>>>>> dev
-    
-    def pop(self):
+            if self.max_length > 0 and len(self.queue) >= self.max_length:
+                raise limits.CapacityError(limits.QUEUE, f"The line for the talking stick is full ({len(self.queue)} people). Please try again later.")
+            self.queue.append(QueueEntry(user.id, user.guild.id))
+            self.version += 1
+
+    def pop(self) -> QueueEntry:
         """
-        Removes and returns the user at the front of the queue.
+        Removes and returns the entry at the front of the queue.
 
         Returns:
-            discord.User: The user at the front of the queue.
+            QueueEntry: The entry at the front of the queue.
         """
         with self.lock:
+            self.version += 1
             return self.queue.pop(0)
-    
-    def peek(self):
+
+    def peek(self) -> QueueEntry:
         """
-        Returns the user at the front of the queue without removing them.
-        
+        Returns the entry at the front of the queue without removing it.
+
         Returns:
-            discord.User: The user at the front of the queue.
+            QueueEntry: The entry at the front of the queue.
         """
         with self.lock:
             return self.queue[0]
-        
+
     def is_empty(self):
         """
         Checks if the queue is empty.
@@ -61,7 +112,7 @@ class StickQueue:
         """
         with self.lock:
             return True if len(self.queue) == 0 else False
-    
+
     def size(self):
         """
         Returns the number of users in the queue.
@@ -83,16 +134,13 @@ class StickQueue:
             user (discord.User): The user to find the location of.
 
         Returns:
-            int: The location of the user in the queue.
+            int: The location of the user in the queue, or None if the user is
+            not queued.
         """
         with self.lock:
-<<<<<<< HEAD
-            return self.queue.index(user)
-=======
-            for i in self.queue:
-                if i["user"] == user:
-                    return self.queue.index(i)
->>>>>>> dev
+            for index, entry in enumerate(self.queue):
+                if entry.user_id == user.id:
+                    return index
 
     def remove(self, user: discord.User):
         """
@@ -102,14 +150,26 @@ class StickQueue:
             user (discord.User): The user to remove.
         """
         with self.lock:
-<<<<<<< HEAD
-            self.queue.remove(user)
-=======
-            for i in self.queue:
-                if i["user"] == user:
-                    self.queue.remove(i)
->>>>>>> dev
-            
+            self.queue[:] = [entry for entry in self.queue if entry.user_id != user.id]
+            self.version += 1
+
+    def snapshot(self) -> tuple:
+        """
+        Returns the queue's version and its user ids in order.
+
+        Returns:
+            tuple: The version and a list of the queued user ids.
+        """
+        with self.lock:
+            return self.version, [entry.user_id for entry in self.queue]
+
+    def retained_bytes(self) -> int:
+        """
+        Returns the number of bytes retained by the queue and its entries.
+        """
+        with self.lock:
+            return sys.getsizeof(self) + sys.getsizeof(self.queue) + sys.getsizeof(self.lock) + sum(entry.retained_bytes() for entry in self.queue)
+
     def clear(self):
         """
         Clears the queue.
@@ -118,4 +178,5 @@ class StickQueue:
         the queue.
         """
         with self.lock:
-            self.queue.clear()
\ No newline at end of file
+            self.queue.clear()
+            self.version += 1
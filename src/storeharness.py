@@ -0,0 +1,168 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import src.ts as ts
+import src.tsjson as tsjson
+import src.statestore as statestore
+from src.simulate import Backend, FakeClient, FakeGuild, FakeTextChannel, FakeVoiceChannel, FakeMember, FakeVoiceState, FakeInteraction
+
+COUNTER = "counter"
+
+# --- Processes ---
+
+def increment(path: str, count: int):
+    """
+    Increments a shared counter record count times with compare-and-set.
+    """
+    store = statestore.SQLiteStateStore(path)
+    for _ in range(count):
+        store.update(COUNTER, "value", lambda record: {"value": (record or {"value": 0})["value"] + 1})
+    store.close()
+
+def build_world(store: statestore.StateStore) -> tuple:
+    """
+    Creates one fake guild with a text channel and a voice channel of two
+    members. Every process builds the same ids, so a session record saved by
+    one process resolves to the same channel in another.
+
+    Returns:
+        tuple: The backend, the client, the text channel and the voice channel.
+    """
+    backend = Backend()
+    client = FakeClient(backend)
+    guild = FakeGuild(backend)
+    backend.guilds[guild.id] = guild
+    tsjson.use_store(store)
+    text = FakeTextChannel(backend, guild)
+    voice = FakeVoiceChannel(backend, guild)
+    backend.channels[text.id] = text
+    backend.channels[voice.id] = voice
+    for _ in range(2):
+        member = FakeMember(backend, guild, next(backend.ids))
+        member.voice = FakeVoiceState(voice)
+        voice.members.append(member)
+        backend.members[member.id] = member
+    return backend, client, text, voice
+
+def stop_timers(manager: ts.StickManager):
+    """
+    Stops the holder timers of restored sessions before their store is closed.
+    """
+    for stick in manager.sticks.values():
+        if stick.timer_task is not None:
+            stick.timer_task.cancel()
+
+def start_session(path: str, directory: str, instance: str, started, taken_over, results):
+    """
+    Starts a session, then saves it again once another process has taken it
+    over. Reports whether that save gave the session up.
+    """
+    async def run():
+        store = statestore.SQLiteStateStore(path)
+        backend, client, text, voice = build_world(store)
+        manager = ts.StickManager(client, store)
+        stick = manager.add_stick(voice)
+        await stick.claim(FakeInteraction(backend, voice.members[0], text))
+        await stick.save_task
+        started.set()
+        await asyncio.to_thread(taken_over.wait)
+        stick.save()
+        await stick.save_task
+        results.put(("owner lost the session on its next save", not stick.owned and manager.get_stick_by_channel(voice) is None))
+        store.close()
+
+    results.put((f"instance {instance} reserved", statestore.claim_instance(instance, directory)))
+    asyncio.run(run())
+
+def take_over(path: str, directory: str, instance: str, taken_instance: str, results):
+    """
+    Takes over every session in the store, presuming their owners dead.
+    """
+    async def run():
+        store = statestore.SQLiteStateStore(path)
+        _, client, _, _ = build_world(store)
+        manager = ts.StickManager(client, store)
+        results.put(("other process took the session over", manager.restore_sticks(stale_after=0) == 1))
+        stop_timers(manager)
+        store.close()
+
+    results.put((f"instance {taken_instance} refused while in use", not statestore.claim_instance(taken_instance, directory)))
+    results.put((f"instance {instance} reserved", statestore.claim_instance(instance, directory)))
+    asyncio.run(run())
+
+def restart(path: str, directory: str, instance: str, results):
+    """
+    Restores the sessions of a previous run of the same instance, without
+    waiting for them to go stale.
+    """
+    async def run():
+        store = statestore.SQLiteStateStore(path)
+        _, client, _, _ = build_world(store)
+        manager = ts.StickManager(client, store)
+        results.put(("restarted instance restored its session", manager.restore_sticks(stale_after=900) == 1))
+        stop_timers(manager)
+        store.close()
+
+    statestore.claim_instance(instance, directory)
+    asyncio.run(run())
+
+# --- Checks ---
+
+def check_counter(context, directory: str, processes: int, count: int) -> list:
+    """
+    Has several processes increment one record at once; none of the
+    increments may be lost.
+    """
+    path = os.path.join(directory, "counter.db")
+    workers = [context.Process(target=increment, args=(path, count)) for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    store = statestore.SQLiteStateStore(path)
+    record, _ = store.get(COUNTER, "value")
+    store.close()
+    total = record["value"] if record is not None else 0
+    return [(f"{processes} processes x {count} increments = {total}", total == processes * count)]
+
+def check_ownership(context, directory: str) -> list:
+    """
+    Has one process start a session and another take it over, then restarts
+    the second process under the same instance id.
+    """
+    path = os.path.join(directory, "sessions.db")
+    results = context.Queue()
+    started, taken_over = context.Event(), context.Event()
+    owner = context.Process(target=start_session, args=(path, directory, "a", started, taken_over, results))
+    owner.start()
+    started.wait()
+    taker = context.Process(target=take_over, args=(path, directory, "b", "a", results))
+    taker.start()
+    taker.join()
+    taken_over.set()
+    owner.join()
+    restarted = context.Process(target=restart, args=(path, directory, "b", results))
+    restarted.start()
+    restarted.join()
+    checks = []
+    while not results.empty():
+        checks.append(results.get())
+    return checks
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the SQLite state store shared between bot processes.")
+    parser.add_argument("--processes", type=int, default=2, help="processes incrementing the counter")
+    parser.add_argument("--count", type=int, default=500, help="increments per process")
+    args = parser.parse_args()
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as directory:
+        checks = check_counter(context, directory, args.processes, args.count) + check_ownership(context, directory)
+    for name, passed in checks:
+        print(f"{'ok  ' if passed else 'FAIL'} {name}")
+    if not all(passed for _, passed in checks):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
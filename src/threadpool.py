@@ -0,0 +1,223 @@
+import time
+import discord
+
+class PooledThread:
+    """
+    A private session thread kept for reuse, as plain ids.
+    """
+    __slots__ = ("thread_id", "parent_id", "member_ids", "last_used")
+
+    def __init__(self, thread_id: int, parent_id: int):
+        """
+        Initializes the PooledThread.
+
+        Parameters:
+            thread_id (int): The id of the private thread.
+            parent_id (int): The id of the text channel the thread belongs to.
+        """
+        self.thread_id = thread_id
+        self.parent_id = parent_id
+        self.member_ids = set()
+        self.last_used = time.monotonic()
+
+    def __repr__(self):
+        return f"PooledThread(thread_id={self.thread_id}, parent_id={self.parent_id}, members={len(self.member_ids)})"
+
+class ThreadPool:
+    def __init__(self, client: discord.Client, max_size: int = 100, max_idle: float = 21600):
+        """
+        Initializes the ThreadPool.
+
+        The pool keeps one private thread per voice channel between sessions.
+        Instead of being deleted when a session ends, the thread is archived;
+        the next session in the same voice channel unarchives it, removes the
+        members who aren't in the session and only adds those who are missing.
+
+        Parameters:
+            client (discord.Client): The client used to resolve thread ids.
+            max_size (int): The most idle threads kept; the least recently used
+            are deleted beyond that.
+            max_idle (float): Seconds an idle thread is kept before it is deleted.
+        """
+        self.client = client
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.idle = {}
+        self.in_use = {}
+
+    async def resolve(self, pooled: PooledThread) -> discord.Thread:
+        """
+        Resolves a pooled thread from the cache, fetching it if needed.
+
+        Parameters:
+            pooled (PooledThread): The pooled thread.
+
+        Returns:
+            discord.Thread: The thread, or None if it no longer exists.
+        """
+        thread = self.client.get_channel(pooled.thread_id)
+        if thread is None:
+            try:
+                thread = await self.client.fetch_channel(pooled.thread_id)
+            except (discord.NotFound, discord.Forbidden):
+                return None
+        return thread
+
+    async def acquire(self, voice_channel_id: int, parent: discord.TextChannel, members: list) -> discord.Thread:
+        """
+        Gets a private thread for a session, reusing the voice channel's idle
+        thread if it belongs to the same text channel.
+
+        A reused thread's members are fetched again rather than trusted from the
+        last session, since members may have left it by hand meanwhile. Members
+        who aren't in members are removed and the missing ones are added.
+
+        Parameters:
+            voice_channel_id (int): The id of the session's voice channel.
+            parent (discord.TextChannel): The text channel the session was started in.
+            members (list): The members to make sure are in the thread.
+
+        Returns:
+            discord.Thread: The unarchived thread.
+        """
+        pooled = self.idle.pop(voice_channel_id, None)
+        thread = None
+        if pooled is not None:
+            if pooled.parent_id == parent.id:
+                thread = await self.resolve(pooled)
+                if thread is not None and thread.archived:
+                    await thread.edit(archived=False)
+                if thread is not None:
+                    await self.sync_members(pooled, thread, members)
+            else:
+                await self.delete(pooled)
+        if thread is None:
+            thread = await parent.create_thread(name="Talking Stick Session", auto_archive_duration=60, type=discord.ChannelType.private_thread)
+            pooled = PooledThread(thread.id, parent.id)
+        self.in_use[voice_channel_id] = pooled
+        for member in members:
+            await self.add_member(voice_channel_id, thread, member)
+        return thread
+
+    async def sync_members(self, pooled: PooledThread, thread: discord.Thread, members: list):
+        """
+        Refreshes a reused thread's member ids from Discord and removes the
+        members who aren't in the new session. The thread's owner, the bot, is
+        kept.
+
+        Parameters:
+            pooled (PooledThread): The pooled thread.
+            thread (discord.Thread): The unarchived thread.
+            members (list): The members of the new session.
+
+        Returns:
+            None
+        """
+        pooled.member_ids = {thread_member.id for thread_member in await thread.fetch_members()}
+        keep = {member.id for member in members}
+        keep.add(thread.owner_id)
+        for member_id in pooled.member_ids - keep:
+            try:
+                await thread.remove_user(discord.Object(member_id))
+            except discord.NotFound:
+                pass
+            pooled.member_ids.discard(member_id)
+
+    async def add_member(self, voice_channel_id: int, thread: discord.Thread, member: discord.Member):
+        """
+        Adds a member to a session's thread unless they are already in it.
+
+        Parameters:
+            voice_channel_id (int): The id of the session's voice channel.
+            thread (discord.Thread): The session's thread.
+            member (discord.Member): The member to add.
+
+        Returns:
+            None
+        """
+        pooled = self.in_use.get(voice_channel_id)
+        if pooled is not None and member.id in pooled.member_ids:
+            return
+        await thread.add_user(member)
+        if pooled is not None:
+            pooled.member_ids.add(member.id)
+
+    async def remove_member(self, voice_channel_id: int, thread: discord.Thread, member: discord.Member):
+        """
+        Removes a member from a session's thread.
+
+        Parameters:
+            voice_channel_id (int): The id of the session's voice channel.
+            thread (discord.Thread): The session's thread.
+            member (discord.Member): The member to remove.
+
+        Returns:
+            None
+        """
+        await thread.remove_user(member)
+        pooled = self.in_use.get(voice_channel_id)
+        if pooled is not None:
+            pooled.member_ids.discard(member.id)
+
+    async def release(self, voice_channel_id: int, thread: discord.Thread):
+        """
+        Archives a session's thread and keeps it for the next session.
+
+        Parameters:
+            voice_channel_id (int): The id of the session's voice channel.
+            thread (discord.Thread): The session's thread.
+
+        Returns:
+            None
+        """
+        pooled = self.in_use.pop(voice_channel_id, None) or PooledThread(thread.id, thread.parent_id)
+        await thread.edit(archived=True)
+        pooled.last_used = time.monotonic()
+        self.idle[voice_channel_id] = pooled
+        while len(self.idle) > self.max_size:
+            oldest = min(self.idle, key=lambda channel_id: self.idle[channel_id].last_used)
+            await self.delete(self.idle.pop(oldest))
+
+    async def delete(self, pooled: PooledThread):
+        """
+        Deletes a pooled thread, ignoring threads that are already gone.
+
+        Parameters:
+            pooled (PooledThread): The thread to delete.
+
+        Returns:
+            None
+        """
+        thread = await self.resolve(pooled)
+        if thread is not None:
+            try:
+                await thread.delete()
+            except discord.NotFound:
+                pass
+
+    async def evict_idle(self) -> int:
+        """
+        Deletes the threads that have been idle for longer than max_idle.
+
+        Returns:
+            int: The number of threads deleted.
+        """
+        now = time.monotonic()
+        expired = [channel_id for channel_id, pooled in self.idle.items() if now - pooled.last_used > self.max_idle]
+        for channel_id in expired:
+            await self.delete(self.idle.pop(channel_id))
+        return len(expired)
+
+    async def close(self) -> int:
+        """
+        Deletes every idle thread, for when the bot shuts down.
+
+        Returns:
+            int: The number of threads deleted.
+        """
+        count = 0
+        while self.idle:
+            _, pooled = self.idle.popitem()
+            await self.delete(pooled)
+            count += 1
+        return count
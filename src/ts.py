@@ -1,55 +1,240 @@
+import sys
+import time
 import discord
 import asyncio
 import src.stickq as stickq
+import src.statestore as statestore
 # import src.config as config
 import src.tsjson as tsjson
-from time import sleep
+import src.threadpool as threadpool
+import src.cache as cache
+import src.holdstats as holdstats
+from src.limits import GuildLimits
 
+QUEUE_PAGE_SIZE = 20
+# the number of queued users shown on a status board
+BOARD_QUEUE_SIZE = 5
+# session modes: server-mute every member, take speak away with channel overwrites,
+# or move only the holder between a stage channel's audience and its speakers
+MUTE = "mute"
+AUDIENCE = "audience"
+STAGE = "stage"
+# what a session's next state store write does: save the record, save it over
+# whoever owns it, or delete it
+SAVE = "save"
+TAKE = "take"
+FORGET = "forget"
+
+# background deletions of session threads, kept so they aren't garbage collected
+_deletions = set()
+
+def is_stage(channel) -> bool:
+    """
+    Returns whether a channel is a stage channel, whose sessions always run in
+    STAGE mode.
+    """
+    return channel.type == discord.ChannelType.stage_voice
+
+async def delete_thread(thread: discord.Thread):
+    """
+    Deletes a session thread after giving members a moment to read its last
+    message.
+    """
+    await asyncio.sleep(3)
+    try:
+        await thread.delete()
+    except discord.HTTPException:
+        pass
 
 class Stick:
-    def __init__(self, channel: discord.VoiceChannel):
+    __slots__ = ("client", "store", "threads", "timer_task", "timer_deadline", "starting", "ending", "active", "queue", "guild_id", "channel_id", "thread_id", "super_stick_id", "pages_key", "pages", "mode", "saved_overwrites", "saved_speakers", "hold_stats", "held_since", "board_interval", "board_id", "board_task", "board_dirty", "board_edited", "board_event", "timeout_settings", "save_task", "save_pending", "owned", "retired")
+
+    def __init__(self, channel: discord.VoiceChannel | discord.StageChannel, client: discord.Client, store: statestore.StateStore = None, threads: threadpool.ThreadPool = None):
         
         """
         Initialize a new Stick object.
 
+        Only plain ids are stored for the guild, voice channel, private thread and
+        super stick holder. They are resolved through the client cache on demand,
+        so a long-lived session does not pin discord.py's cached objects.
+
         Parameters
         ----------
-        channel : discord.VoiceChannel
-            The voice channel where the stick will be active.
+        channel : discord.VoiceChannel or discord.StageChannel
+            The voice or stage channel where the stick will be active.
+        client : discord.Client
+            The client whose cache is used to resolve ids.
+        store : statestore.StateStore
+            The shared store the session record is saved to, if any.
+        threads : threadpool.ThreadPool
+            The pool private threads are reused from. Without one, a thread is
+            created for every session and deleted afterwards.
 
         Attributes
         ----------
         timer_task : asyncio.Task
             The asyncio task that is responsible for changing the owner of the stick
             after a certain amount of time.
+        timer_deadline : float
+            The time.time() at which the running timer task fires.
+        starting : asyncio.Task
+            The session start in progress, if any. Claims made while it runs are
+            queued behind it instead of starting another session.
+        ending : asyncio.Task
+            The session end in progress, if any. Claims made while it runs wait
+            for it, so they never start a session it then tears down.
         active : bool
             Whether the stick is currently active.
-        queue : set
-            The set of users that are currently in the queue.
-        channel : discord.VoiceChannel
-            The voice channel where the stick is active.
-        priv_thread : discord.Thread
-            The private thread that is created for the users in the queue.
+        queue : StickQueue
+            The queue of users waiting for the stick.
+        channel_id : int
+            The id of the voice channel where the stick is active.
+        thread_id : int
+            The id of the private thread that is created for the users in the queue.
+        super_stick_id : int
+            The id of the member holding the super stick, if any.
+        pages : list
+            The rendered /tsqueue pages, valid while pages_key matches the queue.
+        mode : str
+            MUTE, AUDIENCE or STAGE, fixed when the session starts.
+        saved_overwrites : dict
+            In AUDIENCE mode, the original (allow, deny) overwrite values of every
+            role or member whose overwrite the session changed, keyed by id.
+        saved_speakers : list
+            In STAGE mode, the ids of the speakers the session moved to the
+            audience when it started.
+        hold_stats : holdstats.HoldStats
+            Rolling statistics of how long holders keep the stick, seeded from
+            the guild's prior when a session starts, for estimating waits.
+        held_since : float
+            The holdstats.clock() at which the current holder got the stick.
+        board_interval : int
+            The least seconds between edits of the session's status board, or 0
+            to send a thread message for every event instead.
+        timeout_settings : tuple
+            The guild's timeout settings as read when the session started, see
+            tsjson.get_timeout_settings().
+        board_id : int
+            The id of the pinned status board message, if there is one.
+        board_task : asyncio.Task
+            The task editing the status board, if an edit is pending.
+        save_task : asyncio.Task
+            The task writing the session record to the store, if a write is
+            pending.
+        save_pending : str
+            The write the save task makes next: SAVE, TAKE, FORGET or None.
+        owned : bool
+            False once another process has taken the session over, after which
+            the session does nothing more.
+        retired : bool
+            True once the stick has been killed or dropped from its manager.
+            Claims that were waiting for the session to end then start nothing.
         """
+        self.client = client
+        self.store = store
+        self.threads = threads
         self.timer_task = None
+        self.timer_deadline = None
+        self.starting = None
+        self.ending = None
         self.active = False
         self.queue = stickq.StickQueue()
         self.guild_id = channel.guild.id
-        self.channel = channel
-        self.priv_thread = None
-<<<<<<< HEAD
-=======
-        self.super_stick = None
-        self.emergency_used = []
->>>>>>> dev
+        self.channel_id = channel.id
+        self.thread_id = None
+        self.super_stick_id = None
+        self.pages_key = None
+        self.pages = None
+        self.mode = MUTE
+        self.saved_overwrites = {}
+        self.saved_speakers = []
+        self.hold_stats = holdstats.guild_prior(self.guild_id).seeded()
+        self.held_since = None
+        self.board_interval = 0
+        self.timeout_settings = None
+        self.board_id = None
+        self.board_task = None
+        self.board_dirty = False
+        self.board_edited = 0.0
+        self.board_event = None
+        self.save_task = None
+        self.save_pending = None
+        self.owned = True
+        self.retired = False
+
+    @property
+    def guild(self) -> discord.Guild:
+        """
+        The guild of the session, resolved from the client cache.
+        """
+        return self.client.get_guild(self.guild_id)
+
+    @property
+    def channel(self) -> discord.VoiceChannel:
+        """
+        The voice channel of the session, resolved from the client cache.
+        """
+        return self.client.get_channel(self.channel_id)
+
+    @property
+    def priv_thread(self) -> discord.Thread | discord.PartialMessageable:
+        """
+        The private thread of the session, resolved from the guild cache, or None
+        if no thread has been created.
+
+        discord.py drops archived threads from its cache, and session threads
+        archive after an hour without messages. Such a thread resolves to a
+        partial messageable instead, which can still be sent to, unarchiving
+        it, and have its messages edited. Use fetch_thread() where the full
+        thread is needed.
+        """
+        if self.thread_id is None:
+            return None
+        guild = self.guild
+        thread = guild.get_thread(self.thread_id) if guild is not None else None
+        if thread is None:
+            thread = self.client.get_partial_messageable(self.thread_id, guild_id=self.guild_id, type=discord.ChannelType.private_thread)
+        return thread
+
+    async def fetch_thread(self) -> discord.Thread:
+        """
+        Resolves the private thread of the session as a full thread, fetching it
+        if it has been archived out of the cache.
+
+        Returns:
+            discord.Thread: The thread, or None if there is none or it no longer
+            exists.
+        """
+        if self.thread_id is None:
+            return None
+        guild = self.guild
+        thread = guild.get_thread(self.thread_id) if guild is not None else None
+        if thread is None:
+            try:
+                thread = await self.client.fetch_channel(self.thread_id)
+            except (discord.NotFound, discord.Forbidden):
+                return None
+        return thread
+
+    @property
+    def super_stick(self) -> discord.Member:
+        """
+        The member holding the super stick, resolved from the guild cache, or None.
+        """
+        if self.super_stick_id is None:
+            return None
+        return self.guild.get_member(self.super_stick_id)
 
     async def claim(self, interaction: discord.Interaction):
         """
         Claims the talking stick.
 
         If the user doesn't have the stick, it will add the user to the queue and send a message indicating their position in the queue.
+        Only the first claim starts a session. Claims made while it is starting are queued in the order they arrive.
+        Claims made while a session is ending wait for it to end and then start a new one.
         If the user already has the stick, it will send a message indicating that they already have the stick.
-        If the bot is disabled, it will send a message indicating that the bot is disabled.
+        Whether the bot is enabled in the guild is checked by the caller, before the claim is counted against
+        the guild's start rate.
 
         Parameters:
             interaction (discord.Interaction): The interaction object containing information about the command invocation and the user who invoked the command.
@@ -57,42 +242,55 @@ class Stick:
         Returns:
             None
         """
-        
-        if not tsjson.is_guild_enabled(interaction.guild):
-            await interaction.response.send_message("Bot disabled!", ephemeral=True)
+        member = interaction.user
+
+        while self.ending is not None:
+            await asyncio.wait({self.ending})
+        # the stick may have been killed, or the bot started shutting down, meanwhile
+        if self.retired:
+            await interaction.response.send_message("This session has been ended. Please claim the stick again.", ephemeral=True)
             return
 
-        member = interaction.user
-        
-<<<<<<< HEAD
-        if self.active:
-            self.queue.add(member)
-            await interaction.response.send_message(f"You are number {self.queue.get_location()} in line", ephemeral=True)
+        location = self.queue.get_location(member)
+        if location == 0:
+            await interaction.response.send_message("You already have the stick!", ephemeral=True)
             return
-        
+        if location is not None:
+            await interaction.response.send_message(f"You are already number {location} in line{self.wait_text(location)}", ephemeral=True)
+            return
+
         self.queue.add(member)
-=======
-        self.queue.add(member, interaction)
 
-        if self.active:
-            await interaction.response.send_message(f"You are number {self.queue.get_location(member)} in line", ephemeral=True)
+        # a session that is running or still starting only gets a new place in line
+        if self.active or self.starting is not None:
+            self.save()
+            self.refresh_board()
+            location = self.queue.get_location(member)
+            await interaction.response.send_message(f"You are number {location} in line{self.wait_text(location)}", ephemeral=True)
             return
         
->>>>>>> dev
-        self.channel = member.voice.channel
-        await self.start_session(interaction)
+        self.channel_id = member.voice.channel.id
+        self.hold_stats = holdstats.guild_prior(self.guild_id).seeded()
+        self.starting = asyncio.create_task(self.start_session(interaction))
+        try:
+            await self.starting
+        finally:
+            self.starting = None
         self.active = True
+        self.held_since = holdstats.clock()
+        self.save(take=True)
         await interaction.response.send_message("Session started!", ephemeral=True)
-<<<<<<< HEAD
-        await self.priv_thread.send(f"{interaction.user.mention} has claimed the stick! You have {tsjson.get_stick_timeout(interaction.guild)} seconds to speak.")
-        self.timer_task = asyncio.create_task(self.timeout_timer(interaction=interaction))
-=======
-        if tsjson.get_stick_timeout(interaction.guild) == 0:
+        timeout = self.holder_timeout()
+        if timeout != 0:
+            self.start_timer(member.id, timeout)
+        if self.board_interval > 0:
+            await self.open_board()
+        elif timeout == 0:
             await self.priv_thread.send(f"{interaction.user.mention} has claimed the stick!")
         else:
-            await self.priv_thread.send(f"{interaction.user.mention} has claimed the stick! You have {tsjson.get_stick_timeout(interaction.guild)} seconds to speak.")
-            self.timer_task = asyncio.create_task(self.timeout_timer(interaction=interaction))
->>>>>>> dev
+            await self.priv_thread.send(f"{interaction.user.mention} has claimed the stick! You have {timeout} seconds to speak.")
+        # fetched only once the claim is answered, since it can take a while
+        await cache.ensure_members(self.client, interaction.guild)
     
     async def pass_stick(self, interaction: discord.Interaction):
         """
@@ -117,55 +315,319 @@ class Stick:
             return
 
         member = interaction.user
-<<<<<<< HEAD
-        if member.id != self.queue.peek().id:
-=======
-        if member.id != self.queue.peek()["user"].id:
->>>>>>> dev
+        if member.id != self.queue.peek().user_id:
             await interaction.response.send_message("You are not the first in line!", ephemeral=True)
             return
 
+        await interaction.response.send_message("You passed the stick!", ephemeral=True)
+        await self.hand_off(member)
+
+    async def hand_off(self, member: discord.Member):
+        """
+        Moves the stick from the current holder to the next user in queue.
+
+        This does the actual work of passing the stick without needing an
+        interaction, so it can be driven by the timeout timer or by the holder
+        leaving the channel as well as by /tspass. If the queue becomes empty,
+        it ends the session.
+
+        Parameters:
+            member (discord.Member): The member currently holding the stick.
+
+        Returns:
+            None
+        """
+        self.record_hold()
         self.queue.pop()
 
-<<<<<<< HEAD
-        if self.queue.is_empty():
-=======
-        if self.queue.is_empty() and self.super_stick == None:
->>>>>>> dev
-            if not interaction.response.is_done():
-                await interaction.response.send_message("You passed the stick!", ephemeral=True)
+        if self.queue.is_empty() and self.super_stick_id is None:
             await self.end_session()
             return
         
-<<<<<<< HEAD
-        if self.timeout_timer:
-            self.timeout_timer.cancel()
-            self.timeout_timer = None
-
-        next_member = self.queue.peek()
-        # swap who is muted
-        await next_member.edit(mute=False)
-        await member.edit(mute=True)
-        # restart timer
-        self.timer_task = asyncio.create_task(self.timeout_timer(interaction=interaction))
-=======
         if self.timer_task and not self.timer_task.done():
             self.timer_task.cancel()
             self.timer_task = None
 
-        next_member = self.queue.peek()["user"]
-        next_member_interaction = self.queue.peek()["interaction"]
+        next_member = await self.get_member(self.queue.peek().user_id)
         # swap who is muted
-        await next_member.edit(mute=False)
-        if member != self.super_stick:
-            await member.edit(mute=True)
+        await self.give_voice(next_member)
+        self.held_since = holdstats.clock()
+        if member.id != self.super_stick_id:
+            await self.silence(member)
         # restart timer
-        self.timer_task = asyncio.create_task(self.timeout_timer(next_member_interaction))
->>>>>>> dev
+        timeout = self.holder_timeout()
+        self.start_timer(next_member.id, timeout)
+        self.save()
         # finish up
-        if not interaction.response.is_done():
-            await interaction.response.send_message(f"You passed the stick.", ephemeral=True)
-        await self.priv_thread.send(f"{next_member.mention} now has the stick!")
+        if timeout == 0:
+            await self.announce(f"{next_member.mention} now has the stick!")
+        else:
+            await self.announce(f"{next_member.mention} now has the stick! You have {timeout} seconds to speak.")
+
+    async def give_voice(self, member: discord.Member):
+        """
+        Lets a member speak: unmutes them, in AUDIENCE mode allows them the
+        speak permission on the channel, or in STAGE mode moves them to the
+        speakers.
+
+        Parameters:
+            member (discord.Member): The member to give a voice to.
+
+        Returns:
+            None
+        """
+        if self.mode == AUDIENCE:
+            await self.override_speak(member, True)
+        elif self.mode == STAGE:
+            await member.edit(suppress=False)
+        else:
+            await member.edit(mute=False)
+
+    async def silence(self, member: discord.Member):
+        """
+        Stops a member from speaking: mutes them if they are still connected, in
+        AUDIENCE mode restores their original overwrite on the channel, or in
+        STAGE mode moves them back to the audience if they are still on stage.
+
+        Parameters:
+            member (discord.Member): The member to silence.
+
+        Returns:
+            None
+        """
+        if self.mode == AUDIENCE:
+            await self.restore_overwrite(member.id)
+        elif self.mode == STAGE:
+            if member.voice is not None and member.voice.channel is not None and member.voice.channel.id == self.channel_id:
+                await member.edit(suppress=True)
+        elif member.voice is not None:
+            await member.edit(mute=True)
+
+    async def override_speak(self, target, speak: bool):
+        """
+        Sets the speak permission of a role or member on the voice channel.
+
+        The target's original overwrite is saved the first time it is changed,
+        so it can be put back when the session ends.
+
+        Parameters:
+            target (discord.Role or discord.Member): The role or member.
+            speak (bool): Whether the target may speak.
+
+        Returns:
+            None
+        """
+        channel = self.channel
+        overwrite = channel.overwrites_for(target)
+        if target.id not in self.saved_overwrites:
+            allow, deny = overwrite.pair()
+            self.saved_overwrites[target.id] = (allow.value, deny.value)
+        overwrite.speak = speak
+        await channel.set_permissions(target, overwrite=overwrite)
+
+    async def overwrite_target(self, target_id: int):
+        """
+        Resolves the role or member an overwrite belongs to.
+
+        A member who can't be fetched, e.g. because they have left the server,
+        falls back to the target in the channel's cached overwrites.
+
+        Parameters:
+            target_id (int): The id of the role or member.
+
+        Returns:
+            discord.Role or discord.Member: The target, or None if it can't be
+            resolved.
+        """
+        if target_id == self.guild_id:
+            return self.guild.default_role
+        try:
+            return await self.get_member(target_id)
+        except discord.HTTPException:
+            pass
+        for target in self.channel.overwrites:
+            if target.id == target_id and not isinstance(target, discord.Object):
+                return target
+        return None
+
+    async def restore_overwrite(self, target_id: int):
+        """
+        Puts back the original overwrite of a role or member on the voice channel.
+
+        The saved overwrite is only dropped once it has been put back.
+
+        Parameters:
+            target_id (int): The id of the role or member.
+
+        Returns:
+            None
+        """
+        if target_id not in self.saved_overwrites:
+            return
+        allow, deny = self.saved_overwrites[target_id]
+        target = await self.overwrite_target(target_id)
+        if target is None:
+            self.saved_overwrites.pop(target_id)
+            return
+        if allow == 0 and deny == 0:
+            await self.channel.set_permissions(target, overwrite=None)
+        else:
+            await self.channel.set_permissions(target, overwrite=discord.PermissionOverwrite.from_pair(discord.Permissions(allow), discord.Permissions(deny)))
+        self.saved_overwrites.pop(target_id, None)
+
+    async def restore_overwrites(self):
+        """
+        Puts back every overwrite the session changed. @everyone goes first,
+        since while it is denied nobody in the channel can speak, and each
+        member's overwrite is put back on its own, so one that fails doesn't
+        stop the rest.
+
+        Returns:
+            None
+
+        Raises:
+            discord.HTTPException: If @everyone's overwrite can't be put back.
+        """
+        try:
+            await self.restore_overwrite(self.guild_id)
+        finally:
+            for target_id in [target_id for target_id in self.saved_overwrites if target_id != self.guild_id]:
+                try:
+                    await self.restore_overwrite(target_id)
+                except discord.HTTPException:
+                    pass
+
+    async def restore_stage(self) -> int:
+        """
+        Puts the stage back the way the session found it: the speakers it moved
+        to the audience go back on stage, and whoever else is on stage, such as
+        the last holder, goes back to the audience. The super stick is left
+        where it is.
+
+        Returns:
+            int: The number of members moved.
+        """
+        saved = set(self.saved_speakers)
+        self.saved_speakers = []
+        moved = 0
+        for member in self.channel.members:
+            if member.voice is None or member.id == self.super_stick_id:
+                continue
+            if member.id in saved and member.voice.suppress:
+                await member.edit(suppress=False)
+                moved += 1
+            elif member.id not in saved and not member.voice.suppress:
+                await member.edit(suppress=True)
+                moved += 1
+        return moved
+
+    def queue_pages(self, page_size: int = QUEUE_PAGE_SIZE) -> list:
+        """
+        Renders the holder and the queue as pages of text for /tsqueue.
+
+        Each queued user is shown with their estimated wait. The pages are cached
+        and only rendered again once the queue, the super stick or the hold
+        statistics change, or a minute has passed, so checking the queue costs
+        nothing while it stands still.
+
+        Parameters:
+            page_size (int): The number of queued users per page.
+
+        Returns:
+            list: The pages, at least one.
+        """
+        minute = int(holdstats.clock() // 60)
+        key = (self.queue.version, self.super_stick_id, page_size, self.hold_stats.count, minute)
+        if self.pages_key == key:
+            return self.pages
+        version, user_ids = self.queue.snapshot()
+        cap = self.holder_timeout()
+        header = []
+        if user_ids:
+            header.append(f"<@{user_ids[0]}> has the stick.")
+        if self.super_stick_id is not None:
+            header.append(f"<@{self.super_stick_id}> has the super stick.")
+        lines = [f"{position}. <@{user_id}>{self.wait_text(position, cap, ' - ')}" for position, user_id in enumerate(user_ids[1:], start=1)]
+        chunks = [lines[start:start + page_size] for start in range(0, len(lines), page_size)] or [["No one is in line."]]
+        pages = []
+        for number, chunk in enumerate(chunks, start=1):
+            pages.append("\n".join(header + [f"Queue (page {number}/{len(chunks)}):"] + chunk))
+        self.pages_key = (version, self.super_stick_id, page_size, self.hold_stats.count, minute)
+        self.pages = pages
+        return pages
+
+    def record_hold(self):
+        """
+        Adds the current holder's time with the stick to the session's and the
+        guild's hold statistics.
+
+        Returns:
+            None
+        """
+        if self.held_since is None:
+            return
+        seconds = holdstats.clock() - self.held_since
+        self.hold_stats.record(seconds)
+        holdstats.guild_prior(self.guild_id).record(seconds)
+        self.held_since = None
+
+    def wait_text(self, position: int, cap: int = None, prefix: str = ", ") -> str:
+        """
+        Describes the estimated wait of a place in line for a message.
+
+        Parameters:
+            position (int): The place in line, 1 being next.
+            cap (int): The most a hold can last, worked out with holder_timeout()
+            if not given.
+            prefix (str): Put before the estimate.
+
+        Returns:
+            str: e.g. ", about 6 min to wait", or "" if there is no estimate yet.
+        """
+        elapsed = holdstats.clock() - self.held_since if self.held_since is not None else 0.0
+        if cap is None:
+            cap = self.holder_timeout()
+        estimate = self.hold_stats.estimate_wait(position, elapsed, cap)
+        if estimate is None:
+            return ""
+        return f"{prefix}{holdstats.format_wait(estimate)} to wait"
+
+    def expected_mute(self, member_id: int) -> bool:
+        """
+        Returns whether a member of the voice channel should be server-muted.
+
+        During an active session everyone is muted except the stick holder and
+        the super stick; otherwise nobody is.
+
+        Parameters:
+            member_id (int): The id of the member.
+
+        Returns:
+            bool: True if the member should be muted, False otherwise.
+        """
+        if not self.active or member_id == self.super_stick_id:
+            return False
+        with self.queue.lock:
+            return not self.queue.queue or self.queue.queue[0].user_id != member_id
+
+    async def get_member(self, user_id: int) -> discord.Member:
+        """
+        Resolves a queued user id into a member.
+
+        The guild's member cache is tried first; if the member is not cached
+        they are fetched from the API.
+
+        Parameters:
+            user_id (int): The id of the user to resolve.
+
+        Returns:
+            discord.Member: The resolved member.
+        """
+        guild = self.guild
+        member = guild.get_member(user_id)
+        if member is None:
+            member = await guild.fetch_member(user_id)
+        return member
 
     async def start_session(self, interaction: discord.Interaction):      
         """
@@ -176,6 +638,15 @@ class Stick:
         except for the user who invoked the command. It prepares the environment 
         for a talking stick session where only one person can speak at a time.
 
+        In AUDIENCE mode nobody is muted. Instead @everyone is denied the speak
+        permission on the channel and the holder is allowed it, which costs two
+        calls however many members are in the channel.
+
+        A stage channel always runs in STAGE mode. Its audience can't speak
+        already, so only the speakers other than the holder and the super stick
+        are moved to the audience, and the holder is moved on stage. Every
+        hand-off after that costs two calls.
+
         Parameters:
             interaction (discord.Interaction): The interaction object containing 
             information about the command invocation and the user who invoked the 
@@ -184,17 +655,28 @@ class Stick:
         Returns:
             None
         """
-        self.priv_thread = await interaction.channel.create_thread(name="Talking Stick Session", auto_archive_duration=60, type=discord.ChannelType.private_thread)
-        for member in self.channel.members:
-            await self.priv_thread.add_user(member)
-<<<<<<< HEAD
-            if member != interaction.user:
-=======
-            if member != interaction.user and member != self.super_stick:
->>>>>>> dev
-                await member.edit(mute=True)
+        self.mode = STAGE if is_stage(self.channel) else tsjson.get_session_mode(interaction.guild)
+        self.board_interval = tsjson.get_status_board(interaction.guild)
+        self.timeout_settings = tsjson.get_timeout_settings(interaction.guild)
+        thread = await self.open_thread(interaction.channel)
+        if self.mode == AUDIENCE:
+            await self.override_speak(interaction.guild.default_role, False)
+            await self.override_speak(interaction.user, True)
+            if self.super_stick is not None:
+                await self.override_speak(self.super_stick, True)
+        elif self.mode == STAGE:
+            for member in self.channel.members:
+                if member != interaction.user and member.id != self.super_stick_id and member.voice is not None and not member.voice.suppress:
+                    self.saved_speakers.append(member.id)
+                    await member.edit(suppress=True)
+            if interaction.user.voice.suppress:
+                await interaction.user.edit(suppress=False)
+        else:
+            for member in self.channel.members:
+                if member != interaction.user and member.id != self.super_stick_id:
+                    await member.edit(mute=True)
         
-        await self.priv_thread.send("@everyone Talking Stick Session started! Use /tsclaim to claim the stick and /tspass to pass the stick.")
+        await thread.send("@everyone Talking Stick Session started! Use /tsclaim to claim the stick and /tspass to pass the stick.")
         
     async def end_session(self):
         """
@@ -206,36 +688,254 @@ class Stick:
         Returns:
             None
         """
-<<<<<<< HEAD
-        for member in self.channel.members:
-            await member.edit(mute=False)
-        self.active = False
-        if self.timer_task:
-            self.timer_task.cancel()
-        await self.priv_thread.send(f"@everyone No one is queued for the stick! Session ending!")
-        sleep(3)
-        await self.priv_thread.delete()
-=======
-        print("ending")
-        for member in self.channel.members:
-            print(f"unmuting {member.name}")
-            await member.edit(mute=False)
+        await self.run_ending(self.finish_session())
+
+    async def run_ending(self, teardown) -> int:
+        """
+        Runs a session's teardown as its ending task, which claims wait for.
+
+        Parameters:
+            teardown (coroutine): The teardown to run.
+
+        Returns:
+            The teardown's result.
+        """
+        self.ending = asyncio.create_task(teardown)
+        try:
+            return await self.ending
+        finally:
+            self.ending = None
+
+    async def finish_session(self):
+        """
+        Tears down a session whose queue has run out, for end_session().
+
+        Returns:
+            None
+        """
+        # inactive before anything is restored, so speakers put back on stage
+        # aren't taken for members asking to speak in this session
         self.active = False
         self.queue.clear()
+        self.forget()
         if self.timer_task:
-            print("canceling timer")
             self.timer_task.cancel()
             self.timer_task = None
-        print("sending message")
-        await self.priv_thread.send(f"@everyone No one is queued for the stick! Session ending!") # <--------------------
-        print("sleeping")
-        sleep(3)
-        print("deleting")  
-        await self.priv_thread.delete()
-        print("done")
->>>>>>> dev
+        if self.mode == AUDIENCE:
+            await self.restore_overwrites()
+        elif self.mode == STAGE:
+            await self.restore_stage()
+        else:
+            for member in self.channel.members:
+                await member.edit(mute=False)
+        await self.close_board()
+        thread = self.priv_thread
+        if thread is not None:
+            await thread.send(f"@everyone No one is queued for the stick! Session ending!")
+        await self.close_thread()
+
+    async def open_thread(self, parent: discord.TextChannel) -> discord.Thread:
+        """
+        Opens the session's private thread and adds the channel's members to it.
+
+        With a thread pool, the voice channel's archived thread from an earlier
+        session is reused and only members missing from it are added.
+
+        Parameters:
+            parent (discord.TextChannel): The text channel the session was started in.
+
+        Returns:
+            discord.Thread: The session's thread.
+        """
+        if self.threads is not None:
+            thread = await self.threads.acquire(self.channel_id, parent, self.channel.members)
+        else:
+            thread = await parent.create_thread(name="Talking Stick Session", auto_archive_duration=60, type=discord.ChannelType.private_thread)
+            for member in self.channel.members:
+                await thread.add_user(member)
+        self.thread_id = thread.id
+        return thread
+
+    async def close_thread(self):
+        """
+        Closes the session's private thread: archives it back into the thread
+        pool, or without a pool deletes it after giving members a moment to read
+        the last message. The deletion runs in the background, so the session
+        has ended without waiting for it.
+
+        Returns:
+            None
+        """
+        thread_id = self.thread_id
+        thread = await self.fetch_thread()
+        if thread is not None:
+            if self.threads is not None:
+                await self.threads.release(self.channel_id, thread)
+            else:
+                task = asyncio.create_task(delete_thread(thread))
+                _deletions.add(task)
+                task.add_done_callback(_deletions.discard)
+        # a new session may have opened its own thread meanwhile
+        if self.thread_id == thread_id:
+            self.thread_id = None
+
+    def start_timer(self, user_id: int, timeout: int):
+        """
+        Starts the holder's timeout timer, setting its deadline straight away so
+        the status board can show it.
+
+        Parameters:
+            user_id (int): The id of the member holding the stick.
+            timeout (int): The holder's time in seconds.
+
+        Returns:
+            None
+        """
+        self.timer_deadline = time.time() + timeout
+        self.timer_task = asyncio.create_task(self.timeout_timer(user_id, timeout))
 
-    async def timeout_timer(self, interaction: discord.Interaction):
+    async def announce(self, message: str):
+        """
+        Tells the session about a hand-off, timeout, join or leave.
+
+        Without a status board the message is sent to the private thread. With
+        one, the message becomes the board's last event and the board is edited
+        instead, at most once per board_interval seconds however busy the
+        session is.
+
+        Parameters:
+            message (str): The message.
+
+        Returns:
+            None
+        """
+        if self.board_id is None:
+            thread = self.priv_thread
+            if thread is not None:
+                await thread.send(message)
+            return
+        self.board_event = message
+        self.refresh_board()
+
+    def refresh_board(self):
+        """
+        Schedules an edit of the status board, if the session has one.
+
+        Returns:
+            None
+        """
+        if self.board_id is None:
+            return
+        self.board_dirty = True
+        if self.board_task is None or self.board_task.done():
+            self.board_task = asyncio.create_task(self.edit_board())
+
+    def render_board(self) -> str:
+        """
+        Renders the status board: the holder, their time left, the next few in
+        line and the last event.
+
+        Returns:
+            str: The board's text.
+        """
+        _, user_ids = self.queue.snapshot()
+        lines = ["**Talking Stick**"]
+        if user_ids:
+            holder = f"Holder: <@{user_ids[0]}>"
+            if self.timer_task is not None and not self.timer_task.done() and self.timer_deadline is not None:
+                # Discord renders this as a live countdown, so it needs no edits
+                holder += f", time's up <t:{int(self.timer_deadline)}:R>"
+            lines.append(holder)
+        waiting = user_ids[1:]
+        if waiting:
+            lines.append("Next: " + ", ".join(f"<@{user_id}>" for user_id in waiting[:BOARD_QUEUE_SIZE]))
+            if len(waiting) > BOARD_QUEUE_SIZE:
+                lines.append(f"...and {len(waiting) - BOARD_QUEUE_SIZE} more, see /tsqueue")
+        else:
+            lines.append("No one is in line. Use /tsclaim to get in line.")
+        if self.board_event is not None:
+            lines.append(f"Last: {self.board_event}")
+        return "\n".join(lines)
+
+    async def open_board(self):
+        """
+        Sends and pins the session's status board.
+
+        Returns:
+            None
+        """
+        message = await self.priv_thread.send(self.render_board(), allowed_mentions=discord.AllowedMentions.none())
+        self.board_id = message.id
+        self.board_edited = holdstats.clock()
+        self.save()
+        await message.pin()
+
+    async def edit_board(self):
+        """
+        Edits the status board until it shows the latest state, waiting out
+        board_interval between edits so bursts of events cost one edit.
+
+        Returns:
+            None
+        """
+        while self.board_dirty:
+            delay = self.board_edited + self.board_interval - holdstats.clock()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            thread = self.priv_thread
+            if thread is None or self.board_id is None:
+                return
+            self.board_dirty = False
+            self.board_edited = holdstats.clock()
+            await thread.get_partial_message(self.board_id).edit(content=self.render_board())
+
+    async def close_board(self):
+        """
+        Stops editing the status board and deletes it, so a reused thread doesn't
+        keep old boards pinned.
+
+        Returns:
+            None
+        """
+        if self.board_task is not None:
+            self.board_task.cancel()
+            self.board_task = None
+        self.board_dirty = False
+        self.board_event = None
+        if self.board_id is not None and self.priv_thread is not None:
+            try:
+                await self.priv_thread.get_partial_message(self.board_id).delete()
+            except discord.HTTPException:
+                pass
+        self.board_id = None
+
+    def holder_timeout(self) -> int:
+        """
+        Works out how long the current holder may keep the stick.
+
+        With a fixed timeout this is the guild's stick timeout. With an adaptive
+        timeout the guild's target wait is shared between the people in line, so
+        the last of them waits about that long, and the result is kept between
+        the guild's floor and ceiling.
+
+        The guild's settings are read once when the session starts, or the
+        first time they are needed by a restored session, so this is called on
+        every claim and queue view without touching the store or the json file.
+        Changes to the settings apply from the next session.
+
+        Returns:
+            int: The holder's time in seconds, or 0 for no timeout.
+        """
+        if self.timeout_settings is None:
+            self.timeout_settings = tsjson.get_timeout_settings(self.guild)
+        stick_timeout, adaptive = self.timeout_settings
+        if adaptive is None:
+            return stick_timeout
+        target_wait, floor, ceiling = adaptive
+        waiting = max(self.queue.size() - 1, 1)
+        return min(max(target_wait // waiting, floor), ceiling)
+
+    async def timeout_timer(self, user_id: int, timeout: int = None):
         """
         Starts a timeout timer for the current stick holder.
 
@@ -243,40 +943,41 @@ class Stick:
         sends a message to the private thread indicating that the current stick holder 
         has timed out. It subsequently passes the stick to the next user in the queue.
 
+        Only the holder's id is kept while waiting; the member is resolved once
+        the timer fires, so the timer never acts on an expired interaction.
+
         Parameters:
-            interaction (discord.Interaction): The interaction object containing 
-            information about the command invocation and the user who invoked the 
-            command.
+            user_id (int): The id of the member currently holding the stick.
+            timeout (int): The holder's time in seconds, worked out with
+            holder_timeout() if not given.
 
         Returns:
             None
         """
-<<<<<<< HEAD
-        await asyncio.sleep(tsjson.get_stick_timeout(interaction.guild))
-        await self.priv_thread.send(f"{interaction.user.mention} has timed out!")
-        self.timeout_timer = None
-        await self.pass_stick(interaction=interaction)
-=======
-        print("starting timer")
-        timeout = tsjson.get_stick_timeout(interaction.guild)
+        if timeout is None:
+            timeout = self.holder_timeout()
         if timeout == 0:
             return
+        self.timer_deadline = time.time() + timeout
         await asyncio.sleep(timeout)
-        await self.priv_thread.send(f"{interaction.user.mention} has timed out!")
+        if not self.active or self.queue.is_empty() or self.queue.peek().user_id != user_id:
+            return
+        member = await self.get_member(user_id)
+        await self.announce(f"{member.mention} has timed out!")
         self.timer_task = None
-        await self.pass_stick(interaction)
+        await self.hand_off(member)
 
     async def assign_super_stick(self, member: discord.Member):
 
-        if member.voice.channel != self.channel:
+        if member.voice.channel.id != self.channel_id:
             return
         if self.super_stick is not None:
             await self.super_stick.edit(mute=False)
         if self.queue.get_location(member):
             self.queue.remove(member)
-        self.super_stick = member
+        self.super_stick_id = member.id
+        self.save()
         
->>>>>>> dev
 
     async def handle_user_joining(self, member: discord.Member):
         """
@@ -293,9 +994,15 @@ class Stick:
             None
         """
         if self.active:
-            await self.priv_thread.add_user(member)
-            await self.priv_thread.send(f"{member.mention} has joined the session!")
-            await member.edit(mute=True)
+            thread = await self.fetch_thread()
+            if thread is not None:
+                if self.threads is not None:
+                    await self.threads.add_member(self.channel_id, thread, member)
+                else:
+                    await thread.add_user(member)
+            await self.announce(f"{member.mention} has joined the session!")
+            if self.mode == MUTE:
+                await member.edit(mute=True)
 
     async def handle_user_leaving(self, member: discord.Member):
         """
@@ -312,16 +1019,45 @@ class Stick:
             None
         """
         if self.active:
-<<<<<<< HEAD
-            if member == self.queue.peek():
-=======
-            if member == self.queue.peek()["user"]:
->>>>>>> dev
-                await self.pass_stick(member)
-            await self.priv_thread.remove_user(member)
-            await self.priv_thread.send(f"{member.mention} has left the session!")
-            await member.edit(mute=False)
+            if member.id == self.queue.peek().user_id:
+                await self.hand_off(member)
+                if not self.active:
+                    return
+            thread = await self.fetch_thread()
+            if thread is not None:
+                if self.threads is not None:
+                    await self.threads.remove_member(self.channel_id, thread, member)
+                else:
+                    await thread.remove_user(member)
+            await self.announce(f"{member.mention} has left the session!")
+            if self.mode == MUTE:
+                await member.edit(mute=False)
             self.queue.remove(member)
+            self.save()
+            self.refresh_board()
+
+    async def handle_speak_request(self, member: discord.Member) -> int:
+        """
+        Handles a member asking to speak in a stage channel during an active
+        session, by putting them in line as if they had used /tsclaim.
+
+        Parameters:
+            member (discord.Member): The member who asked to speak.
+
+        Returns:
+            int: The member's place in line, or None if they weren't queued
+            because no STAGE session is running or they were already in line.
+
+        Raises:
+            limits.CapacityError: If the line is full.
+        """
+        if not self.active or self.mode != STAGE or self.queue.get_location(member) is not None:
+            return None
+        self.queue.add(member)
+        self.save()
+        location = self.queue.get_location(member)
+        await self.announce(f"{member.mention} asked to speak and is number {location} in line{self.wait_text(location)}.")
+        return location
 
     async def kill_session(self):
         """
@@ -332,30 +1068,240 @@ class Stick:
         a notification to the private thread about the session ending, waits for a 
         short duration, and deletes the private thread.
 
+        A member that can't be unmuted doesn't stop the others from being
+        unmuted, so the session is cleaned up as far as possible. A session that
+        is still starting has its start stopped and undone; one that is already
+        ending is waited for. Either way the stick is retired, so claims waiting
+        for it don't start another session.
+
         Returns:
-            None
+            int: The number of members that were unmuted.
         """
+        self.retired = True
+        if self.ending is not None:
+            await asyncio.wait({self.ending})
+            return 0
+        starting = self.starting
+        if starting is not None:
+            starting.cancel()
+            await asyncio.wait({starting})
+        if not self.active and starting is None:
+            return 0
+        return await self.run_ending(self.abort_session())
 
-        if self.active:
-            if self.timer_task:
-                self.timer_task.cancel()
-            self.active = False
-            self.queue.clear()
+    async def abort_session(self) -> int:
+        """
+        Tears down a session for kill_session().
+
+        Returns:
+            int: The number of members that were unmuted.
+        """
+        restored = 0
+        if self.timer_task:
+            self.timer_task.cancel()
+        self.active = False
+        self.queue.clear()
+        self.forget()
+        if self.mode == AUDIENCE:
+            try:
+                await self.restore_overwrites()
+                restored = len(self.channel.members)
+            except discord.HTTPException:
+                pass
+        elif self.mode == STAGE:
+            try:
+                restored = await self.restore_stage()
+            except discord.HTTPException:
+                pass
+        else:
             for member in self.channel.members:
-                await member.edit(mute=False)
+                try:
+                    await member.edit(mute=False)
+                    restored += 1
+                except discord.HTTPException:
+                    pass
+        if self.priv_thread is not None:
+            await self.close_board()
             await self.priv_thread.send(f"@everyone Session ended!")
-            sleep(3)
-            await self.priv_thread.delete()
+        await self.close_thread()
+        return restored
+
+    def to_record(self) -> dict:
+        """
+        Builds the session record that is saved to the state store.
+
+        Returns:
+            dict: The ids, state and queued user ids of the session, along with
+            the owning process and the time the record was written.
+        """
+        return {
+            "guild_id": self.guild_id,
+            "channel_id": self.channel_id,
+            "thread_id": self.thread_id,
+            "super_stick_id": self.super_stick_id,
+            "active": self.active,
+            "queue": [entry.user_id for entry in self.queue.queue],
+            "mode": self.mode,
+            "board_interval": self.board_interval,
+            "board_id": self.board_id,
+            "overwrites": {str(target_id): list(pair) for target_id, pair in self.saved_overwrites.items()},
+            "speakers": list(self.saved_speakers),
+            "owner": statestore.process_token(),
+            "heartbeat": time.time(),
+        }
+
+    @classmethod
+    def from_record(cls, record: dict, client: discord.Client, store: statestore.StateStore = None, threads: threadpool.ThreadPool = None):
+        """
+        Rebuilds a session from a record saved by this or another process.
+
+        Parameters:
+            record (dict): The session record.
+            client (discord.Client): The client whose cache is used to resolve ids.
+            store (statestore.StateStore): The store the record came from.
+            threads (threadpool.ThreadPool): The pool private threads are reused from.
+
+        Returns:
+            Stick: The restored session, or None if its channel isn't cached.
+        """
+        channel = client.get_channel(record["channel_id"])
+        if channel is None:
+            return None
+        stick = cls(channel, client, store, threads)
+        stick.thread_id = record["thread_id"]
+        stick.super_stick_id = record["super_stick_id"]
+        stick.active = record["active"]
+        stick.mode = record.get("mode", MUTE)
+        stick.board_interval = record.get("board_interval", 0)
+        stick.board_id = record.get("board_id")
+        stick.saved_overwrites = {int(target_id): tuple(pair) for target_id, pair in record.get("overwrites", {}).items()}
+        stick.saved_speakers = record.get("speakers", [])
+        for user_id in record["queue"]:
+            stick.queue.queue.append(stickq.QueueEntry(user_id, stick.guild_id))
+        return stick
+
+    def save(self, take: bool = False):
+        """
+        Saves the session record to the state store, if there is one.
+
+        The record is written by a background task, so a burst of changes costs
+        one write, and stores that block on I/O are written from a worker
+        thread instead of the event loop. The write fails if another process
+        has taken the session over since, and the session is then given up.
+
+        Parameters:
+            take (bool): Whether to write the record whoever owns it, for a
+            session that is starting.
+        """
+        if self.store is None:
+            return
+        if self.save_pending != TAKE:
+            self.save_pending = TAKE if take else SAVE
+        self.schedule_write()
+
+    def forget(self):
+        """
+        Removes the session record from the state store, if there is one and
+        this process still owns it, once any write under way has finished.
+        """
+        if self.store is None:
+            return
+        self.save_pending = FORGET
+        self.schedule_write()
+
+    def schedule_write(self):
+        """
+        Starts the save task unless it is already running.
+        """
+        if self.save_task is None or self.save_task.done():
+            self.save_task = asyncio.create_task(self.write_state())
+
+    async def write_state(self):
+        """
+        Writes the session record until the store has the latest state.
+
+        Returns:
+            None
+        """
+        while self.save_pending is not None:
+            action, self.save_pending = self.save_pending, None
+            record = self.to_record() if action != FORGET else None
+            if self.store.blocking:
+                owned = await asyncio.to_thread(self.write_record, record, action == TAKE)
+            else:
+                owned = self.write_record(record, action == TAKE)
+            if not owned:
+                self.abandon()
+                return
+
+    def write_record(self, record: dict, take: bool = False) -> bool:
+        """
+        Writes or deletes the session record if this process owns it.
+
+        Parameters:
+            record (dict): The record to write, or None to delete it.
+            take (bool): Whether to write the record whoever owns it.
+
+        Returns:
+            bool: False if another process owns the record, True otherwise.
+        """
+        owner = statestore.process_token()
+
+        def apply(current: dict) -> dict:
+            if not take and current is not None and current.get("owner") != owner:
+                raise statestore.OwnershipError(f"Session {self.channel_id} is owned by {current.get('owner')}")
+            return record
+
+        try:
+            self.store.update(statestore.SESSIONS, str(self.channel_id), apply)
+        except statestore.OwnershipError:
+            return False
+        return True
+
+    def abandon(self):
+        """
+        Gives the session up after another process has taken it over. Nothing is
+        sent to Discord or written to the store, since the new owner runs the
+        session from now on.
+
+        Returns:
+            None
+        """
+        for task in (self.timer_task, self.board_task):
+            if task is not None:
+                task.cancel()
+        self.owned = False
+        self.active = False
+        self.queue.clear()
+
+    def retained_bytes(self) -> int:
+        """
+        Estimates the memory retained by this session.
+
+        This counts the Stick itself, its ids, its queue and its timer task. The
+        client and discord.py's cache are shared and are not counted.
+
+        Returns:
+            int: The estimated number of bytes retained by the session.
+        """
+        size = sys.getsizeof(self) + self.queue.retained_bytes()
+        for value in (self.guild_id, self.channel_id, self.thread_id, self.super_stick_id):
+            if value is not None:
+                size += sys.getsizeof(value)
+        if self.timer_task is not None:
+            size += sys.getsizeof(self.timer_task) + sys.getsizeof(self.timer_task.get_coro())
+        if self.pages is not None:
+            size += sys.getsizeof(self.pages) + sum(sys.getsizeof(page) for page in self.pages)
+        size += self.hold_stats.retained_bytes()
+        return size
 
     def __repr__(self):
-<<<<<<< HEAD
-        return f"Stick(active={self.active}, queue={self.queue}, channel={self.channel})"
-=======
-        return f"Stick(active={self.active}, queue={self.queue}, channel={self.channel}), guild_id={self.guild_id}, priv_thread={self.priv_thread}, timer_task={self.timer_task}"
->>>>>>> dev
+        return f"Stick(active={self.active}, queue={self.queue}, channel_id={self.channel_id}, guild_id={self.guild_id}, thread_id={self.thread_id}, timer_task={self.timer_task})"
 
 class StickManager:
-    def __init__(self):
+    __slots__ = ("client", "store", "threads", "limits", "sticks", "guild_sticks", "accepting", "touched")
+
+    def __init__(self, client: discord.Client, store: statestore.StateStore = None, threads: threadpool.ThreadPool = None, limits: GuildLimits = None):
         """
         Initializes the StickManager.
 
@@ -363,25 +1309,113 @@ class StickManager:
         an empty dictionary to store the active talking stick sessions, where the key
         is the voice channel ID and the value is the Stick instance associated with
         that channel.
+
+        Session records are kept in the given state store so that other bot
+        processes sharing it can see, and take over, this process' sessions.
+        Without a store an in-memory one is used. The ids of voice channels that
+        have had a session are kept in touched for the mute reconciler. The
+        sticks are also indexed by guild in guild_sticks, so a claim counts its
+        guild's sessions without looking at every other guild's.
+
+        Parameters:
+            client (discord.Client): The client used by sticks to resolve ids.
+            store (statestore.StateStore): The shared store for session records.
+            threads (threadpool.ThreadPool): The pool sessions reuse private
+            threads from, or None to create and delete one per session.
+            limits (GuildLimits): The per-guild capacity limits. Without
+            them nothing is limited.
         """
+        self.client = client
+        self.store = store if store is not None else statestore.MemoryStateStore()
+        self.threads = threads
+        self.limits = limits if limits is not None else GuildLimits()
         self.sticks = {}
+        self.guild_sticks = {}
+        self.accepting = True
+        self.touched = set()
+
+    def put_stick(self, stick: Stick):
+        """
+        Adds a stick to the manager and its guild's index.
+
+        Parameters:
+            stick (Stick): The stick to add.
+        """
+        self.sticks[stick.channel_id] = stick
+        self.guild_sticks.setdefault(stick.guild_id, {})[stick.channel_id] = stick
+
+    def remove_stick(self, voice_channel_id: int) -> Stick:
+        """
+        Removes a stick from the manager and its guild's index, retiring it.
+
+        Parameters:
+            voice_channel_id (int): The id of the stick's voice channel.
+
+        Returns:
+            Stick or None: The removed stick, or None if there was none.
+        """
+        stick = self.sticks.pop(voice_channel_id, None)
+        if stick is not None:
+            stick.retired = True
+            guild = self.guild_sticks.get(stick.guild_id, {})
+            guild.pop(voice_channel_id, None)
+            if not guild:
+                self.guild_sticks.pop(stick.guild_id, None)
+        return stick
     
-    def add_stick(self, channel: discord.VoiceChannel)  -> Stick:
+    def add_stick(self, channel: discord.VoiceChannel | discord.StageChannel)  -> Stick:
         """
-        Adds a talking stick session for the given voice channel to the manager.
+        Gets the talking stick session for the given voice channel, adding it to
+        the manager if needed, for a claim in that channel.
 
         If the channel does not already have a talking stick session, this function
         initializes a new Stick instance for the channel and stores it in the dictionary
         of active sessions.
 
+        If the claim would start a session, the guild's session limit and start
+        rate are checked first. Stage channels are handled here like voice
+        channels; their sessions run in STAGE mode once started.
+
         Parameters:
-            channel (discord.VoiceChannel): The voice channel to add a talking stick
-            session for.
+            channel (discord.VoiceChannel or discord.StageChannel): The channel to
+            add a talking stick session for.
+
+        Returns:
+            Stick: The channel's new or existing stick.
+
+        Raises:
+            limits.CapacityError: If the guild may not start another session.
         """
         voice_channel_id = channel.id
-        if voice_channel_id not in self.sticks:
-            self.sticks[voice_channel_id] = Stick(channel)
-            return self.sticks[voice_channel_id]
+        stick = self.owned_stick(voice_channel_id)
+        if stick is not None and (stick.active or stick.starting is not None):
+            return stick
+        sessions = sum(1 for other in self.guild_sticks.get(channel.guild.id, {}).values() if other.active or other.starting is not None)
+        self.limits.check_start(channel.guild.id, sessions)
+        if stick is None:
+            self.touched.add(voice_channel_id)
+            stick = Stick(channel, self.client, self.store, self.threads)
+            stick.queue.max_length = self.limits.max_queue
+            self.put_stick(stick)
+        return stick
+
+    def owned_stick(self, voice_channel_id: int) -> Stick:
+        """
+        Gets the stick of a voice channel, dropping it from the manager if
+        another process has taken its session over.
+
+        Parameters:
+            voice_channel_id (int): The id of the voice channel.
+
+        Returns:
+            Stick or None: The channel's stick, or None if there is none this
+            process still owns.
+        """
+        stick = self.sticks.get(voice_channel_id)
+        if stick is not None and not stick.owned:
+            self.remove_stick(voice_channel_id)
+            return None
+        return stick
 
     def del_stick(self, channel: discord.VoiceChannel):
         """
@@ -396,7 +1430,55 @@ class StickManager:
         """
         voice_channel_id = channel.id
         if voice_channel_id in self.sticks:
-            del self.sticks[voice_channel_id]
+            self.remove_stick(voice_channel_id).forget()
+
+    def touch_sticks(self) -> None:
+        """
+        Refreshes the heartbeat of every active session record in the store.
+
+        Other processes only take over sessions whose heartbeat has gone stale,
+        so this must run more often than their stale_after. Sessions another
+        process has taken over are dropped.
+        """
+        for voice_channel_id in list(self.sticks):
+            stick = self.owned_stick(voice_channel_id)
+            if stick is not None and stick.active:
+                stick.save()
+
+    def restore_sticks(self, stale_after: float = 900) -> int:
+        """
+        Takes over sessions from the state store.
+
+        A session is restored if its voice channel is in this client's cache and
+        it is either owned by this process or its owner hasn't refreshed it for
+        stale_after seconds. Ownership is taken with compare-and-set, so two
+        processes never restore the same session.
+
+        Parameters:
+            stale_after (float): Seconds after which another owner is presumed dead.
+
+        Returns:
+            int: The number of sessions restored.
+        """
+        owner = statestore.process_token()
+        restored = 0
+        for key, (record, version) in self.store.items(statestore.SESSIONS).items():
+            if record["channel_id"] in self.sticks:
+                continue
+            if record["owner"] != owner and time.time() - record["heartbeat"] < stale_after:
+                continue
+            stick = Stick.from_record(record, self.client, self.store, self.threads)
+            if stick is None:
+                continue
+            if not self.store.compare_and_set(statestore.SESSIONS, key, stick.to_record(), version):
+                continue
+            stick.queue.max_length = self.limits.max_queue
+            self.put_stick(stick)
+            self.touched.add(stick.channel_id)
+            if stick.active and not stick.queue.is_empty():
+                stick.timer_task = asyncio.create_task(stick.timeout_timer(stick.queue.peek().user_id))
+            restored += 1
+        return restored
 
     def purge_sticks(self) -> int:
         """
@@ -410,16 +1492,14 @@ class StickManager:
         """
         num_sticks_purged = 0
         for voice_channel_id in list(self.sticks):
-            if not self.sticks[voice_channel_id].active:
-                del self.sticks[voice_channel_id]
+            stick = self.sticks[voice_channel_id]
+            # sticks still starting or ending are in use, though not active
+            if not stick.active and stick.starting is None and stick.ending is None:
+                self.remove_stick(voice_channel_id)
                 num_sticks_purged += 1
         return num_sticks_purged
     
-<<<<<<< HEAD
-    def get_stick_by_channel(self, channel: discord.VoiceChannel):
-=======
     def get_stick_by_channel(self, channel: discord.VoiceChannel) -> Stick:
->>>>>>> dev
         """
         Gets the talking stick session for the given voice channel from the manager.
 
@@ -435,7 +1515,7 @@ class StickManager:
             there is no active session.
         """
         voice_channel_id = channel.id
-        return self.sticks.get(voice_channel_id)
+        return self.owned_stick(voice_channel_id)
 
     def get_sticks_by_guild(self, guild: discord.Guild):
         """
@@ -447,7 +1527,7 @@ class StickManager:
         Returns:
             list: A list of Stick instances for the given guild.
         """
-        return [stick for stick in self.sticks.values() if stick.guild_id == guild.id]
+        return list(self.guild_sticks.get(guild.id, {}).values())
     
     async def kill_sticks(self, guild: discord.Guild):
         """
@@ -465,4 +1545,109 @@ class StickManager:
         sticks = self.get_sticks_by_guild(guild)
         for stick in sticks:
             await stick.kill_session()
-            self.del_stick(stick.channel)
\ No newline at end of file
+            self.remove_stick(stick.channel_id)
+
+    def forget_sticks(self, guild: discord.Guild) -> int:
+        """
+        Drops every talking stick session of a guild the bot has left.
+
+        The guild's channels and members can no longer be reached, so nothing is
+        sent to Discord: timers are stopped and the sessions are removed from the
+        manager and the state store.
+
+        Parameters:
+            guild (discord.Guild): The guild the bot has left.
+
+        Returns:
+            int: The number of sessions dropped.
+        """
+        sticks = self.get_sticks_by_guild(guild)
+        for stick in sticks:
+            for task in (stick.timer_task, stick.board_task):
+                if task is not None:
+                    task.cancel()
+            stick.active = False
+            stick.queue.clear()
+            stick.forget()
+            self.remove_stick(stick.channel_id)
+        return len(sticks)
+
+    async def drain(self, deadline: float) -> dict:
+        """
+        Ends every active talking stick session before the bot shuts down.
+
+        New claims are refused from this point on. All sessions, including those
+        still starting or ending, are killed concurrently; any that haven't
+        finished when the deadline passes are cancelled and left as they are.
+        Pending writes to the state store and thread deletions then get whatever
+        time is left.
+
+        Parameters:
+            deadline (float): The number of seconds to wait for the sessions.
+
+        Returns:
+            dict: The number of sessions and members restored and abandoned, and
+            the number of pooled threads deleted. Abandoned members are those
+            still server-muted in the cache.
+        """
+        self.accepting = False
+        # claims already waiting for a session to end must not start another
+        for stick in self.sticks.values():
+            stick.retired = True
+        started = time.monotonic()
+        sticks = [stick for stick in self.sticks.values() if stick.active or stick.starting is not None or stick.ending is not None]
+        summary = {"sessions_restored": 0, "sessions_abandoned": 0, "members_restored": 0, "members_abandoned": 0, "threads_deleted": 0}
+        tasks = {asyncio.create_task(stick.kill_session()): stick for stick in sticks}
+        done, pending = set(), set()
+        if tasks:
+            done, pending = await asyncio.wait(tasks, timeout=deadline)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        writes = [stick.save_task for stick in self.sticks.values() if stick.save_task is not None and not stick.save_task.done()]
+        writes.extend(_deletions)
+        remaining = deadline - (time.monotonic() - started)
+        if writes and remaining > 0:
+            await asyncio.wait(writes, timeout=remaining)
+        remaining = deadline - (time.monotonic() - started)
+        if self.threads is not None and remaining > 0:
+            try:
+                summary["threads_deleted"] = await asyncio.wait_for(self.threads.close(), remaining)
+            except (asyncio.TimeoutError, discord.HTTPException):
+                pass
+        for task, stick in tasks.items():
+            if task in done and not task.cancelled() and task.exception() is None:
+                summary["sessions_restored"] += 1
+                summary["members_restored"] += task.result()
+                continue
+            summary["sessions_abandoned"] += 1
+            channel = stick.channel
+            if channel is not None:
+                summary["members_abandoned"] += sum(1 for member in channel.members if member.voice is not None and member.voice.mute)
+        self.sticks.clear()
+        self.guild_sticks.clear()
+        return summary
+
+    def memory_report(self, projected_sessions: int = 50000) -> dict:
+        """
+        Reports the memory retained by the talking stick sessions.
+
+        Parameters:
+            projected_sessions (int): The session count to project the total for.
+
+        Returns:
+            dict: The number of sessions, the bytes retained by each session keyed
+            by voice channel id, the total and mean bytes, and the total projected
+            for projected_sessions sessions.
+        """
+        per_session = {channel_id: stick.retained_bytes() for channel_id, stick in self.sticks.items()}
+        total = sys.getsizeof(self.sticks) + sum(per_session.values())
+        mean = total // len(per_session) if per_session else 0
+        return {
+            "sessions": len(per_session),
+            "per_session": per_session,
+            "total_bytes": total,
+            "mean_bytes": mean,
+            "projected_sessions": projected_sessions,
+            "projected_bytes": mean * projected_sessions,
+        }
\ No newline at end of file
@@ -1,10 +1,35 @@
 import json
 import discord
+import src.statestore as statestore
+
+_store = None
+
+def use_store(store: statestore.StateStore) -> None:
+    """
+    Keeps guild settings in a shared state store instead of the json file.
+
+    Guilds already in the json file are copied into the store if they are not
+    there yet, so switching a deployment over keeps its settings. Passing None
+    goes back to the json file.
+
+    Args:
+        store (statestore.StateStore): The store to use, or None.
+    """
+    global _store
+    _store = store
+    if store is None:
+        return
+    try:
+        data = get_guild_json()
+    except FileNotFoundError:
+        return
+    for guild_id, settings in data.items():
+        store.add(statestore.GUILDS, str(guild_id), settings)
 
 def get_guild_json() -> dict:
     """
     Reads the guilds from the json file and returns them as a dict.
-    
+
     Returns:
         dict: A dictionary with the guild id as the key and a dictionary containing
               the guild name and a boolean indicating if the bot is enabled in the guild.
@@ -16,7 +41,7 @@ def get_guild_json() -> dict:
 def write_guild_json(data: dict) -> None:
     """
     Writes the given data to the guilds json file.
-    
+
     Args:
         data (dict): A dictionary with the guild id as the key and a dictionary containing
                     the guild name and a boolean indicating if the bot is enabled in the guild.
@@ -24,6 +49,155 @@ def write_guild_json(data: dict) -> None:
     with open("json/guilds.json", "w") as f:
         json.dump(data, f, indent=4)
 
+def new_guild_settings(guild: discord.Guild) -> dict:
+    """
+    Returns the default settings for a newly installed guild.
+
+    Args:
+        guild (discord.Guild): The guild to create settings for.
+
+    Returns:
+        dict: The guild name, the bot enabled, and the default stick timeout.
+    """
+    return {
+        "name": guild.name,
+        "enabled": True,
+        "stick_timeout": 120
+    }
+
+def read_guild(guild: discord.Guild) -> dict:
+    """
+    Reads the settings of a guild from the state store or the json file.
+
+    Args:
+        guild (discord.Guild): The guild to read.
+
+    Returns:
+        dict: The guild's settings, or None if the guild isn't installed.
+    """
+    if _store is not None:
+        settings, _ = _store.get(statestore.GUILDS, str(guild.id))
+        return settings
+    return get_guild_json().get(str(guild.id))
+
+def update_guild(guild: discord.Guild, update) -> dict:
+    """
+    Applies a change to the settings of a guild, installing it first if needed.
+
+    With a state store the change is applied with compare-and-set, so several
+    processes can update the same guild without losing writes.
+
+    Args:
+        guild (discord.Guild): The guild to update.
+        update (callable): Takes the guild's settings and changes them in place.
+
+    Returns:
+        dict: The updated settings.
+    """
+    def apply(settings):
+        if settings is None:
+            settings = new_guild_settings(guild)
+        update(settings)
+        return settings
+
+    if _store is not None:
+        return _store.update(statestore.GUILDS, str(guild.id), apply)
+    data = get_guild_json()
+    settings = apply(data.get(str(guild.id)))
+    data[str(guild.id)] = settings
+    write_guild_json(data)
+    return settings
+
+def guild_settings(guild: discord.Guild) -> dict:
+    """
+    Reads the settings of a guild, falling back to the defaults without writing
+    anything if the guild isn't installed yet.
+
+    Args:
+        guild (discord.Guild): The guild to read.
+
+    Returns:
+        dict: The guild's settings.
+    """
+    settings = read_guild(guild)
+    return settings if settings is not None else new_guild_settings(guild)
+
+def in_shards(guild_id: str, shard_ids: list, shard_count: int) -> bool:
+    """
+    Checks if a guild belongs to one of the given shards.
+
+    Args:
+        guild_id (str): The id of the guild.
+        shard_ids (list): The shards to check, or None if the bot isn't sharded.
+        shard_count (int): The total number of shards.
+
+    Returns:
+        bool: True if the guild is on one of the shards, or the bot isn't sharded.
+    """
+    if shard_ids is None or not shard_count:
+        return True
+    return (int(guild_id) >> 22) % shard_count in shard_ids
+
+def sync_guilds(guilds: list, shard_ids: list = None, shard_count: int = None) -> tuple:
+    """
+    Makes the installed guilds match the guilds the bot is in.
+
+    Guilds the bot is in but that aren't installed are added with the default
+    settings, and installed guilds the bot is no longer in are removed. The json
+    file is read and written at most once however many guilds change.
+
+    A sharded process only sees the guilds of its own shards, so only installed
+    guilds on those shards are removed; the others belong to the processes
+    running the other shards.
+
+    Args:
+        guilds (list): Every guild the bot is in, e.g. client.guilds.
+        shard_ids (list): The shards this process runs, or None if it isn't sharded.
+        shard_count (int): The total number of shards.
+
+    Returns:
+        tuple: The number of guilds added and the number removed.
+    """
+    current = {str(guild.id): guild for guild in guilds}
+    if _store is not None:
+        installed = _store.items(statestore.GUILDS)
+        added = removed = 0
+        for guild_id, guild in current.items():
+            if guild_id not in installed and _store.add(statestore.GUILDS, guild_id, new_guild_settings(guild)):
+                added += 1
+        for guild_id in installed:
+            if guild_id not in current and in_shards(guild_id, shard_ids, shard_count):
+                _store.delete(statestore.GUILDS, guild_id)
+                removed += 1
+        return added, removed
+    try:
+        data = get_guild_json()
+    except FileNotFoundError:
+        data = {}
+    missing = [guild_id for guild_id in current if guild_id not in data]
+    departed = [guild_id for guild_id in data if guild_id not in current and in_shards(guild_id, shard_ids, shard_count)]
+    for guild_id in missing:
+        data[guild_id] = new_guild_settings(current[guild_id])
+    for guild_id in departed:
+        del data[guild_id]
+    if missing or departed:
+        write_guild_json(data)
+    return len(missing), len(departed)
+
+def remove_guild(guild: discord.Guild) -> None:
+    """
+    Removes the settings of a guild the bot has left.
+
+    Args:
+        guild (discord.Guild): The guild to remove.
+    """
+    if _store is not None:
+        _store.delete(statestore.GUILDS, str(guild.id))
+        return
+    data = get_guild_json()
+    if data.pop(str(guild.id), None) is not None:
+        write_guild_json(data)
+
 def check_guild_installed(guild: discord.Guild) -> None:
     """
     Checks if a guild is in the disabled guilds json file. If it isn't, it adds it
@@ -32,16 +206,9 @@ def check_guild_installed(guild: discord.Guild) -> None:
     Args:
         guild (discord.Guild): The guild to check.
     """
-    data = get_guild_json()
-    if str(guild.id) not in data:
-        new_guild = {
-            "name": guild.name,
-            "enabled": True,
-            "stick_timeout": 120
-        }
-        data[guild.id] = new_guild
-        write_guild_json(data)
-    
+    if read_guild(guild) is None:
+        update_guild(guild, lambda settings: None)
+
 def enable_guild(guild: discord.Guild) -> None:
     """
     Enables the bot in the given guild. If the guild is not in the disabled guilds
@@ -50,10 +217,7 @@ def enable_guild(guild: discord.Guild) -> None:
     Args:
         guild (discord.Guild): The guild to enable the bot in.
     """
-    check_guild_installed(guild)
-    data = get_guild_json()
-    data[str(guild.id)]["enabled"] = True
-    write_guild_json(data)
+    update_guild(guild, lambda settings: settings.update(enabled=True))
 
 def disable_guild(guild: discord.Guild) -> None:
     """
@@ -63,10 +227,7 @@ def disable_guild(guild: discord.Guild) -> None:
     Args:
         guild (discord.Guild): The guild to disable the bot in.
     """
-    check_guild_installed(guild)
-    data = get_guild_json()
-    data[str(guild.id)]["enabled"] = False
-    write_guild_json(data)
+    update_guild(guild, lambda settings: settings.update(enabled=False))
 
 def is_guild_enabled(guild: discord.Guild) -> bool:
     """
@@ -78,33 +239,129 @@ def is_guild_enabled(guild: discord.Guild) -> bool:
     Returns:
         bool: True if the bot is enabled in the guild, False otherwise.
     """
-    check_guild_installed(guild)
-    data = get_guild_json()
-    return data[str(guild.id)]["enabled"]
+    return guild_settings(guild)["enabled"]
 
-def get_stick_timeout(guild: discord.Guild) -> int:
+def get_session_mode(guild: discord.Guild) -> str:
     """
-    Gets the talking stick timeout for the given guild.
+    Gets the session mode for the given guild.
 
     Args:
-        guild (discord.Guild): The guild to get the timeout for.
+        guild (discord.Guild): The guild to get the session mode for.
 
     Returns:
-        int: The timeout in seconds.
+        str: "mute" to server-mute every member, or "audience" to take the speak
+             permission away from the channel with a single overwrite.
     """
-    check_guild_installed(guild)
-    data = get_guild_json()
-    return data[str(guild.id)]["stick_timeout"]
+    return guild_settings(guild).get("session_mode", "mute")
+
+def set_session_mode(guild: discord.Guild, mode: str) -> None:
+    """
+    Sets the session mode for the given guild.
+
+    Args:
+        guild (discord.Guild): The guild to set the session mode for.
+        mode (str): "mute" or "audience".
+    """
+    update_guild(guild, lambda settings: settings.update(session_mode=mode))
+
+def get_status_board(guild: discord.Guild) -> int:
+    """
+    Gets the status board interval for the given guild.
+
+    Args:
+        guild (discord.Guild): The guild to get the interval for.
+
+    Returns:
+        int: The least seconds between edits of a session's status board, or 0
+             if sessions send a thread message for every event instead.
+    """
+    return guild_settings(guild).get("status_board", 0)
+
+def set_status_board(guild: discord.Guild, interval: int) -> None:
+    """
+    Sets the status board interval for the given guild.
+
+    Args:
+        guild (discord.Guild): The guild to set the interval for.
+        interval (int): The least seconds between edits of a session's status
+                        board, or 0 to turn the status board off.
+    """
+    update_guild(guild, lambda settings: settings.update(status_board=interval))
+
+def get_stage_requests(guild: discord.Guild) -> bool:
+    """
+    Gets whether asking to speak in a stage channel queues for the stick in the
+    given guild.
+
+    Args:
+        guild (discord.Guild): The guild to get the setting for.
+
+    Returns:
+        bool: True if members who ask to speak during a stage session are put
+              in line, False otherwise.
+    """
+    return guild_settings(guild).get("stage_requests", False)
+
+def set_stage_requests(guild: discord.Guild, enabled: bool) -> None:
+    """
+    Sets whether asking to speak in a stage channel queues for the stick in the
+    given guild.
+
+    Args:
+        guild (discord.Guild): The guild to set the setting for.
+        enabled (bool): Whether members who ask to speak are put in line.
+    """
+    update_guild(guild, lambda settings: settings.update(stage_requests=enabled))
 
 def set_stick_timeout(guild: discord.Guild, timeout: int) -> None:
     """
-    Sets the talking stick timeout for the given guild.
+    Sets a fixed talking stick timeout for the given guild, turning the adaptive
+    timeout off.
 
     Args:
         guild (discord.Guild): The guild to set the timeout for.
         timeout (int): The timeout in seconds.
     """
-    check_guild_installed(guild)
-    data = get_guild_json()
-    data[str(guild.id)]["stick_timeout"] = timeout
-    write_guild_json(data)
\ No newline at end of file
+    update_guild(guild, lambda settings: settings.update(stick_timeout=timeout, timeout_mode="fixed"))
+
+def adaptive_timeout(settings: dict) -> tuple:
+    """
+    Picks the adaptive timeout settings out of a guild's settings.
+
+    Args:
+        settings (dict): The guild's settings.
+
+    Returns:
+        tuple: The target maximum wait, the floor and the ceiling of a holder's
+               time, in seconds, or None if the guild uses a fixed timeout.
+    """
+    if settings.get("timeout_mode", "fixed") != "adaptive":
+        return None
+    return settings["target_wait"], settings["timeout_floor"], settings["timeout_ceiling"]
+
+def get_timeout_settings(guild: discord.Guild) -> tuple:
+    """
+    Gets everything that decides a holder's time in the given guild with a
+    single read of its settings.
+
+    Args:
+        guild (discord.Guild): The guild to get the settings for.
+
+    Returns:
+        tuple: The fixed stick timeout in seconds, and the adaptive timeout
+               settings as returned by adaptive_timeout().
+    """
+    settings = guild_settings(guild)
+    return settings["stick_timeout"], adaptive_timeout(settings)
+
+def set_adaptive_timeout(guild: discord.Guild, target_wait: int, floor: int, ceiling: int) -> None:
+    """
+    Makes the talking stick timeout of the given guild adapt to the queue.
+
+    Args:
+        guild (discord.Guild): The guild to set the timeout for.
+        target_wait (int): The longest anyone in line should wait, in seconds.
+        floor (int): The least time a holder gets, in seconds.
+        ceiling (int): The most time a holder gets, in seconds.
+    """
+    update_guild(guild, lambda settings: settings.update(timeout_mode="adaptive", target_wait=target_wait, timeout_floor=floor, timeout_ceiling=ceiling))
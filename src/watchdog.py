@@ -0,0 +1,121 @@
+import asyncio
+import bisect
+import sys
+import threading
+import time
+import traceback
+import src.stick_logger as logger
+
+# upper bounds, in seconds, of the lag histogram buckets; the last bucket is unbounded
+LAG_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+class LoopWatchdog:
+    def __init__(self, log: logger.StickLogger, interval: float = 0.25, threshold: float = 0.5):
+        """
+        Initializes the LoopWatchdog.
+
+        The watchdog measures event loop lag continuously: a heartbeat coroutine
+        sleeps for interval seconds and records how late it wakes up. A helper
+        thread watches the heartbeat, and when the loop has been stuck for more
+        than threshold seconds it logs the stack the loop is stuck in, which
+        points straight at the blocking call.
+
+        Parameters:
+            log (logger.StickLogger): The logger blocked-loop stacks are sent to.
+            They are rate limited under the "loop.blocked" event.
+            interval (float): Seconds between heartbeats.
+            threshold (float): Seconds the loop may be blocked before its stack
+            is captured.
+        """
+        self.log = log
+        self.interval = interval
+        self.threshold = threshold
+        self.counts = [0] * (len(LAG_BUCKETS) + 1)
+        self.max_lag = 0.0
+        self.heartbeat = time.monotonic()
+        self.loop_thread_id = None
+        self.task = None
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def start(self):
+        """
+        Starts the heartbeat on the running loop and the helper thread.
+
+        Returns:
+            None
+        """
+        self.loop_thread_id = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        self.stopped.clear()
+        self.task = asyncio.get_running_loop().create_task(self.beat())
+        self.thread = threading.Thread(target=self.watch, name="loop-watchdog", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stops the heartbeat and the helper thread.
+
+        Returns:
+            None
+        """
+        self.stopped.set()
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def beat(self):
+        """
+        Records how late each heartbeat wakes up in the lag histogram.
+
+        Returns:
+            None
+        """
+        while True:
+            before = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self.heartbeat = time.monotonic()
+            lag = max(0.0, self.heartbeat - before - self.interval)
+            self.counts[bisect.bisect_left(LAG_BUCKETS, lag)] += 1
+            self.max_lag = max(self.max_lag, lag)
+
+    def watch(self):
+        """
+        Runs in the helper thread, logging the loop's stack once per stall.
+
+        Returns:
+            None
+        """
+        reported = None
+        while not self.stopped.wait(self.threshold / 2):
+            heartbeat = self.heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval
+            if stalled < self.threshold or reported == heartbeat:
+                continue
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is None:
+                continue
+            reported = heartbeat
+            stack = "".join(traceback.format_stack(frame))
+            self.log.log_warning("Event loop blocked for %.2f seconds in:\n%s", stalled, stack, event="loop.blocked")
+
+    def histogram(self) -> dict:
+        """
+        Returns the lag histogram.
+
+        Returns:
+            dict: The number of heartbeats per bucket, keyed by the bucket's
+            upper bound in seconds ("inf" for the last bucket).
+        """
+        bounds = [str(bound) for bound in LAG_BUCKETS] + ["inf"]
+        return dict(zip(bounds, self.counts))
+
+    def summary(self) -> str:
+        """
+        Returns the lag histogram as one line of text.
+
+        Returns:
+            str: The heartbeat count, the maximum lag and the non-empty buckets.
+        """
+        buckets = " ".join(f"<={bound}s:{count}" for bound, count in self.histogram().items() if count)
+        return f"{sum(self.counts)} heartbeats, max lag {self.max_lag:.3f}s, {buckets}"
@@ -3,10 +3,6 @@
 script_dir=$(dirname "$(readlink -f "$0")")
 
 cd $script_dir
-<<<<<<< HEAD
+# install.sh creates the virtual environment in this directory
 source bin/activate
 python3 bot.py
-=======
-source talking-stick/bin/activate
-python3 bot.py
->>>>>>> dev